@@ -0,0 +1,25 @@
+import asyncio
+import pspython.pspyinstruments as pspyinstruments
+import pspython.pspymethods as pspymethods
+
+
+async def measure():
+    manager = pspyinstruments.AsyncInstrumentManager(max_chunk_latency=0.1)
+    available_instruments = manager.discover_instruments()
+    print('connecting to ' + available_instruments[0].name)
+    if manager.connect(available_instruments[0]) != 1:
+        print('connection failed')
+        return
+
+    method = pspymethods.chronoamperometry(interval_time=0.01, e=1.0, run_time=10.0)
+
+    # the event loop stays free while measuring, other tasks (analysis, UI) keep running
+    measurement = manager.measure(method)
+    async for chunk in measurement:
+        print(f"points {chunk['index'][0]}-{chunk['index'][-1]}: mean {chunk['y_type']} = {chunk['y'].mean()} {chunk['y_unit']}")
+    print('measurement finished: ' + (await measurement).Title)
+
+    manager.disconnect()
+
+
+asyncio.run(measure())
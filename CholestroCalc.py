@@ -3,13 +3,13 @@ import os
 import json
 import numpy as np
 import pandas as pd
-import joblib  # For loading the model
-from train_model import extract_features
+from dpv_features import extract_features, BASIC_FEATURES
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QMenuBar, QMenu, QAction,
                             QFileDialog, QComboBox, QLabel, QGroupBox, QSpinBox,
                             QDoubleSpinBox, QTabWidget, QTextEdit, QMessageBox,
-                            QStatusBar, QGridLayout, QRadioButton, QButtonGroup)
+                            QStatusBar, QGridLayout, QRadioButton, QButtonGroup,
+                            QTableView, QHeaderView)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon
 import matplotlib.pyplot as plt
@@ -18,6 +18,13 @@ from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as Navigatio
 import pspython.pspyinstruments as pspyinstruments
 import pspython.pspymethods as pspymethods
 from calibration_model import CalibrationModel
+from live_plot import LivePlot
+from model_registry import ModelRegistry
+from scan_buffer import ScanBuffer, expected_points
+from scan_table import ScanTableModel
+
+MODEL_FILE = 'rf_model.pkl'  # a bundle written with model_registry.py can be used as well
+FEATURE_COLUMNS = BASIC_FEATURES
 
 class ParameterGroup(QGroupBox):
     def __init__(self, title, parameters):
@@ -44,13 +51,15 @@ class ParameterGroup(QGroupBox):
         return {param: widget.value() for param, widget in self.parameters.items()}
 
 class ElectrochemicalApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, fps=30):
         super().__init__()
         self.setWindowTitle("Creatinine Test-By Izzah Batool Javed Mphil Applied Chemistry(2023-2025)")
         self.setGeometry(100, 100, 1400, 900)
         
+        self.fps = fps  # maximum number of plot redraws per second
+
         # Initialize data storage
-        self.current_data = {'voltage': [], 'current': []}
+        self.current_data = ScanBuffer(features=True)
         self.all_measurements = []
         
         # Initialize instrument manager
@@ -62,7 +71,7 @@ class ElectrochemicalApp(QMainWindow):
         self.measurement_in_progress = False
         
         self.setup_ui()
-        self.model, self.poly, self.scaler = self.load_model()
+        self.models = self.load_model()
         self.calibration_model = CalibrationModel(degree=2)  # Instantiate the CalibrationModel
         
     def setup_ui(self):
@@ -133,7 +142,7 @@ class ElectrochemicalApp(QMainWindow):
             return  # If user cancels, do nothing and return
 
         # Clear previous data
-        self.current_data = {'voltage': [], 'current': []}
+        self.current_data.clear()
         self.update_plot()  # Update the plot to reflect the cleared data
         self.update_data_display()  # Clear the data display
         self.statusBar.showMessage("Ready for new measurement")    
@@ -227,6 +236,10 @@ class ElectrochemicalApp(QMainWindow):
         self.figure, self.ax = plt.subplots()
         self.canvas = FigureCanvas(self.figure)
         self.toolbar = NavigationToolbar(self.canvas, self)
+        self.ax.set_xlabel('Potential (V)')
+        self.ax.set_ylabel('Current (A)')
+        self.ax.grid(True)
+        self.live_plot = LivePlot(self.figure, self.ax, self.canvas, fps=self.fps, legend=False)
         
         plot_layout.addWidget(self.toolbar)
         plot_layout.addWidget(self.canvas)
@@ -235,9 +248,13 @@ class ElectrochemicalApp(QMainWindow):
         # Data tab
         data_tab = QWidget()
         data_layout = QVBoxLayout()
-        self.data_text = QTextEdit()
-        self.data_text.setReadOnly(True)
-        data_layout.addWidget(self.data_text)
+        self.data_model = ScanTableModel(self.current_data)
+        self.data_table = QTableView()
+        self.data_table.setModel(self.data_model)
+        # fixed row heights, so the view does not measure every row of long scans
+        self.data_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.data_table.horizontalHeader().setStretchLastSection(True)
+        data_layout.addWidget(self.data_table)
         data_tab.setLayout(data_layout)
         
         # Results tab
@@ -308,11 +325,12 @@ class ElectrochemicalApp(QMainWindow):
         try:
             # Update data storage
             if 'x' in new_data and 'y' in new_data:
-                self.current_data['voltage'].append(float(new_data['x'][0]))
-                self.current_data['current'].append(float(new_data['y'][0]))
+                # a single point or a chunk of points, see InstrumentManager(batch=True)
+                self.current_data.extend(new_data['x'], new_data['y'])
             
-            # Update plot
+            # Update plot, the event loop is blocked while measuring so draw here when a frame is due
             self.update_plot()
+            self.live_plot.draw_if_due()
             
             # Update data display
             self.update_data_display()
@@ -322,21 +340,15 @@ class ElectrochemicalApp(QMainWindow):
 
     def update_plot(self):
         try:
-            self.ax.clear()
-            self.ax.plot(self.current_data['voltage'], self.current_data['current'])
-            self.ax.set_xlabel('Potential (V)')
-            self.ax.set_ylabel('Current (A)')
-            self.ax.grid(True)
-            self.canvas.draw()
+            # the live plot redraws at most fps times per second
+            self.live_plot.set_live_data(self.current_data.voltage, self.current_data.current, color='C0')
         except Exception as e:
             self.statusBar.showMessage(f"Error updating plot: {str(e)}")
 
     def update_data_display(self):
         try:
-            data_text = "Voltage (V)\tCurrent (A)\n"
-            for v, i in zip(self.current_data['voltage'], self.current_data['current']):
-                data_text += f"{v:.6f}\t{i:.6e}\n"
-            self.data_text.setText(data_text)
+            # the table only formats the visible rows
+            self.data_model.set_buffer(self.current_data)
         except Exception as e:
             self.statusBar.showMessage(f"Error updating data display: {str(e)}")
 
@@ -366,47 +378,40 @@ class ElectrochemicalApp(QMainWindow):
             self.statusBar.showMessage(f"Connection error: {str(e)}")
     def get_peak_current_value(self, voltage):
    
-        if not self.current_data['voltage'] or not self.current_data['current']:
+        if len(self.current_data) == 0:
             return None
         
-        for i, v in enumerate(self.current_data['voltage']):
-            if abs(v - voltage) < 1e-4:  # Check if voltage is close to the target
-                return self.current_data['current'][i]
+        # Check if voltage is close to the target
+        close = np.flatnonzero(np.abs(self.current_data.voltage - voltage) < 1e-4)
+        if len(close):
+            return self.current_data.current[close[0]]
         return None   
     def final_prediction(self):
-        if not self.current_data['voltage'] or not self.current_data['current']:
+        if len(self.current_data) == 0:
             self.statusBar.showMessage("No data available for prediction.")
             return
 
-        # Create a DataFrame for the current data
-        data = pd.DataFrame({
-            'Voltage': self.current_data['voltage'],
-            'Current': self.current_data['current']
-        })
-
-        # Extract features from the current data
-        features = extract_features(data)
+        # The features were accumulated while the scan came in
+        if self.current_data.features is not None:
+            features = self.current_data.features.as_dict(FEATURE_COLUMNS)
+        else:
+            data = pd.DataFrame({
+                'Voltage': self.current_data.voltage,
+                'Current': self.current_data.current
+            })
+            features = extract_features(data, FEATURE_COLUMNS)
 
         # Prepare a DataFrame for the features that the model expects
-        feature_array = pd.DataFrame([[features['Peak_Height'], 
-                                        features['Peak_Potential'], 
-                                        features['Area_Under_Curve'], 
-                                        features['Mean_Current'], 
-                                        features['Std_Current'], 
-                                        features['Skew_Current']]], 
-                                    columns=['Peak_Height', 'Peak_Potential', 'Area_Under_Curve', 'Mean_Current', 'Std_Current', 'Skew_Current'])
-
-        # Load the trained model
-        model = joblib.load('rf_model.pkl')
+        feature_array = pd.DataFrame([features], columns=FEATURE_COLUMNS)
 
-        # Predict concentration using the model
-        concentration_pred = model.predict(feature_array)
+        # Predict concentration using the model, which is kept loaded by the registry
+        concentration_pred = self.models.predict('features', feature_array)
 
         # Display the predicted concentration
         QMessageBox.information(self, "Result", f"Predicted Concentration: {concentration_pred[0]:.4f} µM ")
     def predict_concentration(self):
         # Ensure there is data to predict
-        if not self.current_data['voltage'] or not self.current_data['current']:
+        if len(self.current_data) == 0:
             self.statusBar.showMessage("No data available for prediction.")
             return
         
@@ -417,12 +422,8 @@ class ElectrochemicalApp(QMainWindow):
             self.statusBar.showMessage("No peak current found at 0.102075 V.")
             return
         
-        # Prepare features for prediction
-        scan_features = self.poly.transform([[0.102075, peak_current_value ]])
-        scan_features = self.scaler.transform(scan_features)
-        
-        # Predict concentration using the model
-        concentration_pred = self.model.predict(scan_features)
+        # Predict concentration using the model, the features are transformed by its preprocessing
+        concentration_pred = self.models.predict('voltage_current', [[0.102075, peak_current_value]])
         
         # Display the predicted concentration
         QMessageBox.information(self, "Prediction Result", f"Predicted Concentration: {concentration_pred[0]:.4f} nM")     
@@ -466,11 +467,14 @@ class ElectrochemicalApp(QMainWindow):
                     equilibration_time=params["Equilibration Time (s)"]
                 )
             
-            # Clear previous data
-            self.current_data = {'voltage': [], 'current': []}
+            # Preallocate storage for the expected number of points
+            self.current_data = ScanBuffer(expected_points(self.measurement_type, params), features=True)
             
             # Start measurement
-            if self.manager.measure(method):
+            self.measurement_in_progress = True
+            measurement = self.manager.measure(method)
+            self.measurement_in_progress = False
+            if measurement:
                 self.statusBar.showMessage("Measurement started")
                 self.start_btn.setEnabled(False)
                 self.stop_btn.setEnabled(True)
@@ -507,7 +511,7 @@ class ElectrochemicalApp(QMainWindow):
             return  # If user cancels, do nothing and return
 
         # Clear previous data
-        self.current_data = {'voltage': [], 'current': []}
+        self.current_data.clear()
         self.update_plot()  # Update the plot to reflect the cleared data
         self.update_data_display()  # Clear the data display
         self.statusBar.showMessage("Ready for new measurement")
@@ -554,7 +558,7 @@ class ElectrochemicalApp(QMainWindow):
             16.568925, 16.747426, 16.803424, 17.020424, 17.349422, 17.60142, 17.877918,
     18.374918
         ]
-        self.current_data = {'voltage': voltage, 'current': current}
+        self.current_data = ScanBuffer.from_arrays(voltage, current, features=True)
     
         # Update plot and data display
         self.update_plot()
@@ -568,8 +572,8 @@ class ElectrochemicalApp(QMainWindow):
             )
             if filename:
                 df = pd.DataFrame({
-                    'Voltage (V)': self.current_data['voltage'],
-                    'Current (A)': self.current_data['current']
+                    'Voltage (V)': self.current_data.voltage,
+                    'Current (A)': self.current_data.current
                 })
                 df.to_csv(filename, index=False)
                 self.statusBar.showMessage(f"Data saved to {filename}")
@@ -583,10 +587,7 @@ class ElectrochemicalApp(QMainWindow):
             )
             if filename:
                 df = pd.read_csv(filename)
-                self.current_data = {
-                    'voltage': df['Voltage (V)'].tolist(),
-                    'current': df['Current (A)'].tolist()
-                }
+                self.current_data = ScanBuffer.from_arrays(df['Voltage (V)'].to_numpy(), df['Current (A)'].to_numpy(), features=True)
                 self.update_plot()
                 self.update_data_display()
                 self.statusBar.showMessage(f"Data loaded from {filename}")
@@ -600,7 +601,7 @@ class ElectrochemicalApp(QMainWindow):
                 "PNG files (*.png);;PDF files (*.pdf);;All Files (*)"
             )
             if filename:
-                self.figure.savefig(filename, dpi=300, bbox_inches='tight')
+                self.live_plot.savefig(filename, dpi=300, bbox_inches='tight')
                 self.statusBar.showMessage(f" Plot exported to {filename}")
         except Exception as e:
             self.statusBar.showMessage(f"Error exporting plot: {str(e)}")
@@ -617,13 +618,13 @@ class ElectrochemicalApp(QMainWindow):
 
     def analyze_data(self):
         try:
-            if not self.current_data['voltage'] or not self.current_data['current']:
+            if len(self.current_data) == 0:
                 self.statusBar.showMessage("No data to analyze")
                 return
 
             # Basic analysis
-            current_array = np.array(self.current_data['current'])
-            voltage_array = np.array(self.current_data['voltage'])
+            current_array = self.current_data.current
+            voltage_array = self.current_data.voltage
             
             peak_current = np.max(np.abs(current_array))
             peak_voltage = voltage_array[np.argmax(np.abs(current_array))]
@@ -650,30 +651,30 @@ class ElectrochemicalApp(QMainWindow):
             print(f"Error during shutdown: {str(e)}")
             event.accept()
     def load_model(self):
-    # Load the trained model, polynomial features, and scaler
-        
-        model = joblib.load('rf_model.pkl')  # Ensure this file is in the same directory as main.py
-        poly = joblib.load('poly.pkl')
-        scaler = joblib.load('scaler.pkl')
-        return model, poly, scaler        
+    # Load the trained model, polynomial features, and scaler once, the registry keeps them
+    # loaded and reloads them when the files change
+        models = ModelRegistry()
+        models.register('features', MODEL_FILE, features=FEATURE_COLUMNS)
+        models.register('voltage_current', MODEL_FILE, preprocessing=['poly.pkl', 'scaler.pkl'],
+                        features=['Voltage', 'Current'])
+        models.get('features')
+        models.get('voltage_current')
+        return models        
     def predict_concentration(self):
     # Ensure there is data to predict
-        if not self.current_data['voltage'] or not self.current_data['current']:
+        if len(self.current_data) == 0:
             self.statusBar.showMessage("No data available for prediction.")
             return
        
-        latest_voltage = np.mean(self.current_data['voltage'])
-        latest_current = np.mean(self.current_data['current'])
-        
-        # Prepare features for prediction as a DataFrame
-        features = pd.DataFrame([[latest_voltage, latest_current]], columns=['Voltage', 'Current'])
+        latest_voltage = np.mean(self.current_data.voltage)
+        latest_current = np.mean(self.current_data.current)
         
-        # Transform features for prediction
-        scan_features = self.poly.transform(features)
-        scan_features = self.scaler.transform(scan_features)
+        # Features for prediction in the order Voltage, Current, the registry runs poly.pkl and
+        # scaler.pkl as one fused kernel on the raw values
+        features = np.array([[latest_voltage, latest_current]])
         
-        # Predict concentration using the model
-        concentration_pred = self.model.predict(scan_features)
+        # Predict concentration using the model, the features are transformed by its preprocessing
+        concentration_pred = self.models.predict('voltage_current', features)
         
         # Display the predicted concentration
         QMessageBox.information(self, "Prediction Result", f"Predicted Concentration: {concentration_pred[0]:.4f} µM")
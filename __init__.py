@@ -1,10 +1,18 @@
 import importlib.util
-spec_files = importlib.util.find_spec('pspython.pspyfiles')
-files = importlib.util.module_from_spec(spec_files)
-spec_files.loader.exec_module(files)
-spec_instruments = importlib.util.find_spec('pspython.pspyinstruments')
-instruments = importlib.util.module_from_spec(spec_instruments)
-spec_instruments.loader.exec_module(instruments)
-spec_methods = importlib.util.find_spec('pspython.pspymethods')
-methods = importlib.util.module_from_spec(spec_methods)
-spec_methods.loader.exec_module(methods)
\ No newline at end of file
+spec_session = importlib.util.find_spec('pspython.pspysession')
+session = importlib.util.module_from_spec(spec_session)
+spec_session.loader.exec_module(session)
+try:
+    spec_files = importlib.util.find_spec('pspython.pspyfiles')
+    files = importlib.util.module_from_spec(spec_files)
+    spec_files.loader.exec_module(files)
+    spec_instruments = importlib.util.find_spec('pspython.pspyinstruments')
+    instruments = importlib.util.module_from_spec(spec_instruments)
+    spec_instruments.loader.exec_module(instruments)
+    spec_methods = importlib.util.find_spec('pspython.pspymethods')
+    methods = importlib.util.module_from_spec(spec_methods)
+    spec_methods.loader.exec_module(methods)
+except ImportError:
+    # pythonnet and/or the PalmSens .NET libraries are not available (e.g. on Linux),
+    # session files can still be read with pspython.pspysession
+    pass
\ No newline at end of file
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import skew, kurtosis
+
+# Compares the vectorized dpv_features.extract_features_batch with the per scan pandas
+# implementation from creatanine.py (copied below) on N synthetic scans and checks that
+# both give the same features.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import dpv_features
+
+trapz = getattr(np, 'trapezoid', None) or np.trapz
+
+
+def extract_features_pandas(data):
+    features = {}
+    features['Peak_Height'] = data['Current'].max()
+    peak_idx = data['Current'].idxmax()
+    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
+    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
+    features['Mean_Current'] = data['Current'].mean()
+    features['Std_Current'] = data['Current'].std()
+    features['Skew_Current'] = skew(data['Current'])
+    features['Kurtosis_Current'] = kurtosis(data['Current'])
+    features['Voltage_Range'] = data['Voltage'].max() - data['Voltage'].min()
+    features['Voltage_Centroid'] = (data['Voltage'] * data['Current']).sum() / data['Current'].sum()
+    features['SNR'] = data['Current'].max() / data['Current'].std()
+    half_max = data['Current'].max() / 2
+    half_max_indices = np.where(data['Current'] >= half_max)[0]
+    if len(half_max_indices) >= 2:
+        fwhm_voltage_range = data['Voltage'].iloc[half_max_indices[-1]] - data['Voltage'].iloc[half_max_indices[0]]
+    else:
+        fwhm_voltage_range = 0
+    features['FWHM'] = fwhm_voltage_range
+    data['dI/dV'] = np.gradient(data['Current'], data['Voltage'])
+    data['d2I/dV2'] = np.gradient(data['dI/dV'], data['Voltage'])
+    features['Max_dI/dV'] = data['dI/dV'].max()
+    features['Max_d2I/dV2'] = data['d2I/dV2'].max()
+    return features
+
+
+def synthetic_scans(n_scans, n_points, seed=0):
+    # gaussian peaks near 0.1 V on a sloping baseline, with noise
+    rng = np.random.default_rng(seed)
+    voltage = np.linspace(-0.5, 0.5, n_points)
+    height = rng.uniform(5, 30, (n_scans, 1))
+    center = rng.normal(0.1, 0.02, (n_scans, 1))
+    width = rng.uniform(0.05, 0.15, (n_scans, 1))
+    current = 6 + 4 * voltage + height * np.exp(-((voltage - center) / width) ** 2)
+    current += rng.normal(0, 0.2, current.shape)
+    return voltage, current
+
+
+if __name__ == '__main__':
+    n_scans = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_points = 99
+    voltage, current = synthetic_scans(n_scans, n_points)
+
+    start = time.perf_counter()
+    reference = pd.DataFrame([extract_features_pandas(pd.DataFrame({'Voltage': voltage, 'Current': c}))
+                              for c in current])[dpv_features.FEATURE_NAMES].to_numpy()
+    pandas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = dpv_features.extract_features_batch(voltage, current)
+    numpy_time = time.perf_counter() - start
+
+    error = np.max(np.abs(features - reference) / np.maximum(np.abs(reference), 1e-12))
+    print(f'{n_scans} scans x {n_points} points')
+    print(f'pandas per scan: {pandas_time:8.3f} s ({n_scans / pandas_time:10.0f} scans/s)')
+    print(f'numpy batch:     {numpy_time:8.3f} s ({n_scans / numpy_time:10.0f} scans/s), {pandas_time / numpy_time:.0f}x')
+    print(f'max relative difference: {error:.2e}')
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+# Compares poly.pkl + scaler.pkl (PolynomialFeatures and StandardScaler on a DataFrame, as in the
+# GUIs) with the fused_preprocessing.PolynomialScaler kernel on raw arrays, for one row and for
+# a batch, and checks that both give identical results.
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+from fused_preprocessing import PolynomialScaler
+
+n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+def mean_time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    poly = joblib.load(os.path.join(root, 'poly.pkl'))
+    scaler = joblib.load(os.path.join(root, 'scaler.pkl'))
+    kernel = PolynomialScaler.from_sklearn(poly, scaler)
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack((rng.normal(0.1, 0.05, n_rows), rng.normal(15, 5, n_rows)))
+    frame = pd.DataFrame(X, columns=['Voltage', 'Current'])
+
+    def sklearn_one():
+        return scaler.transform(poly.transform(pd.DataFrame(X[:1], columns=['Voltage', 'Current'])))
+
+    identical = np.array_equal(kernel.transform(X), scaler.transform(poly.transform(frame)))
+    single = mean_time(sklearn_one, 1000)
+    single_fused = mean_time(lambda: kernel.transform(X[:1]), 1000)
+    batch = mean_time(lambda: scaler.transform(poly.transform(frame)), 20)
+    batch_fused = mean_time(lambda: kernel.transform(X), 20)
+    print(f'{kernel}, identical: {identical}')
+    print(f'one row:     sklearn {1e6 * single:8.1f} us, fused {1e6 * single_fused:8.1f} us ({single / single_fused:.0f}x)')
+    print(f'{n_rows} rows: sklearn {1e3 * batch:8.2f} ms, fused {1e3 * batch_fused:8.2f} ms ({batch / batch_fused:.1f}x)')
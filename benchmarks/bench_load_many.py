@@ -0,0 +1,23 @@
+import os
+import time
+import pspython.pspybatch as pspybatch
+
+# Loads the bundled session and scan files (repeated to simulate an archive) with an increasing
+# number of worker processes and reports the throughput and the speedup over a single process.
+
+scriptDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+copies = 50
+
+
+if __name__ == '__main__':
+    paths = pspybatch.expand_paths([os.path.join(scriptDir, '*.pssession'), os.path.join(scriptDir, 'scan*.csv')]) * copies
+    baseline = None
+    workers = 1
+    while workers <= os.cpu_count():
+        start = time.perf_counter()
+        dataset = pspybatch.load_many(paths, workers=workers)
+        duration = time.perf_counter() - start
+        baseline = baseline or duration
+        print(f'{workers:3d} workers: {len(paths) / duration:8.1f} files/s, {len(dataset) / duration:12,.0f} points/s, '
+              f'speedup {baseline / duration:5.2f}x')
+        workers *= 2
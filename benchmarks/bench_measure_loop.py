@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+
+# Compares the event loop of InstrumentManager.measure before (1 ms sleep polling) and after
+# (blocking on the queue) with a simulated instrument that raises data events from another thread,
+# like the .NET callbacks do. Reports the CPU time used by the loop and the wake-up latency.
+
+rate = 200  # events per second
+duration = 3.0  # seconds
+
+
+def polling_loop(q, state):
+    while state['measuring']:
+        qsize = q.qsize()
+        for i in range(qsize):
+            callback = q.get()
+            callback()
+            q.task_done()
+        time.sleep(.001)
+
+
+def blocking_loop(q, state):
+    while state['measuring']:
+        try:
+            callback = q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        callback()
+        q.task_done()
+
+
+def simulated_instrument(q, state):
+    n_events = int(rate * duration)
+    for i in range(n_events):
+        time.sleep(1 / rate)
+        sent = time.perf_counter()
+        q.put(lambda sent=sent: state['latencies'].append(time.perf_counter() - sent))
+    q.put(lambda: state.update(measuring=False))
+
+
+def run(loop):
+    q = queue.Queue()
+    state = {'measuring': True, 'latencies': []}
+    result = {}
+
+    def consumer():
+        start = time.thread_time()
+        loop(q, state)
+        result['cpu'] = time.thread_time() - start
+
+    instrument = threading.Thread(target=simulated_instrument, args=(q, state))
+    start = time.perf_counter()
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    instrument.start()
+    instrument.join()
+    thread.join()
+    wall = time.perf_counter() - start
+    latencies = sorted(state['latencies'])
+    return result['cpu'] / wall, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+for name, loop in (('polling (before)', polling_loop), ('blocking (after)', blocking_loop)):
+    cpu, p50, p99 = run(loop)
+    print(f'{name}: CPU {cpu * 100:5.1f} % of a core, wake latency p50 {p50 * 1e6:7.1f} us, p99 {p99 * 1e6:7.1f} us')
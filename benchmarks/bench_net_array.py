@@ -0,0 +1,35 @@
+import os
+import time
+import clr
+import pspython.pspydata as pspydata
+
+# Reports the number of points per second read from PalmSens DataArrays with the bulk
+# (Marshal.Copy) and the per-item (get_Item) path. Requires pythonnet and the PalmSens libraries.
+
+scriptDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+clr.AddReference(scriptDir + '\\PalmSens.Core.dll')
+clr.AddReference(scriptDir + '\\PalmSens.Core.Windows.dll')
+from PalmSens.Windows import LoadSaveHelperFunctions
+
+files = ['eis.1161.b.pssession', 'Demo CV DPV EIS IS-C electrode.pssession']
+min_duration = 1.0
+
+
+def points_per_second(read, arrays):
+    n_points = 0
+    n_repeats = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_duration:
+        for array in arrays:
+            n_points += len(read(array))
+        n_repeats += 1
+    return n_points / (time.perf_counter() - start), n_repeats
+
+
+for filename in files:
+    session = LoadSaveHelperFunctions.LoadSessionFile(os.path.join(scriptDir, filename))
+    arrays = [array for m in session for array in m.DataSet.GetDataArrays()]
+    for name, read in (('bulk', pspydata._get_values_from_NETArray_bulk),
+                       ('per item', pspydata._get_values_from_NETArray_per_item)):
+        rate, n_repeats = points_per_second(read, arrays)
+        print(f'{filename} {name:>8}: {rate:12,.0f} points/s ({len(arrays)} arrays, {n_repeats} repeats)')
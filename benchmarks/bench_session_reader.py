@@ -0,0 +1,42 @@
+import os
+import time
+import pspython.pspysession as pspysession
+
+# Compares the pure Python session reader against the .NET based pspyfiles.load_session_file.
+# The .NET path is skipped when pythonnet or the PalmSens libraries are not available.
+
+scriptDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+files = ['eis.1161.b.pssession', 'Demo CV DPV EIS IS-C electrode.pssession', 'DPV.pssession']
+repeats = 20
+
+
+def benchmark(load, path):
+    start = time.perf_counter()
+    measurements = load(path, load_peak_data=True, load_eis_fits=True)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(repeats):
+        load(path, load_peak_data=True, load_eis_fits=True)
+    mean = (time.perf_counter() - start) / repeats
+    n_points = sum(len(c.x_array) for curves in measurements.values() for c in curves)
+    n_points += sum(len(a) for m in measurements for a in m.current_arrays + m.freq_arrays)
+    return first, mean, len(measurements), n_points
+
+
+start = time.perf_counter()
+try:
+    import pspython.pspyfiles as pspyfiles
+    loaders = {'.NET': pspyfiles.load_session_file}
+    print(f'.NET startup: {time.perf_counter() - start:.3f} s')
+except ImportError as e:
+    loaders = {}
+    print(f'.NET path unavailable ({e})')
+loaders['python'] = pspysession.load_session_file
+
+for filename in files:
+    path = os.path.join(scriptDir, filename)
+    size = os.path.getsize(path) / 1024
+    for name, load in loaders.items():
+        first, mean, n_measurements, n_points = benchmark(load, path)
+        print(f'{filename} ({size:.0f} KB) {name:>6}: first {first * 1000:8.2f} ms, '
+              f'mean {mean * 1000:8.2f} ms, {n_measurements} measurements, {n_points} points')
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import pspython.pspyinstruments as pspyinstruments
+import pspython.pspysimulator as pspysimulator
+
+# Drives the acquisition path with simulated instruments, so it runs without hardware or .NET.
+# Measures how many points per second the InstrumentManager delivers to the callback (per point
+# and in chunks) and how an InstrumentPool scales with the number of instruments.
+
+scriptDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+source = os.path.join(scriptDir, 'scan_147_5M.csv')
+rate = 50000  # points per second per simulated instrument
+repeat = 200  # the scan has 99 points, replay it repeat times per measurement
+
+
+def run_manager(batch):
+    received = [0]
+
+    def callback(data):
+        received[0] += len(data['index']) if batch else 1
+
+    manager = pspyinstruments.InstrumentManager(new_data_callback=callback, batch=batch)
+    device = pspysimulator.SimulatedDevice(source, rate=rate, repeat=repeat, noise=0.01, seed=1)
+    manager.connect(manager.discover_instruments(simulated=[device])[0])
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    manager.measure(None)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    manager.disconnect()
+    return received[0], elapsed, cpu
+
+
+def run_pool(n_instruments):
+    received = [0]
+
+    def callback(data):
+        received[0] += len(data['index'])
+
+    pool = pspyinstruments.InstrumentPool(new_data_callback=callback, batch=True)
+    devices = [pspysimulator.SimulatedDevice(source, name=f'sim{i}', rate=rate, repeat=repeat, seed=i)
+               for i in range(n_instruments)]
+    pool.discover_instruments(simulated=devices)
+    pool.connect()
+    start = time.perf_counter()
+    results = pool.measure(None)
+    elapsed = time.perf_counter() - start
+    pool.disconnect()
+    return received[0], elapsed, len(results)
+
+
+if __name__ == '__main__':
+    print(f'{sys.platform}, {os.cpu_count()} cpus, {rate} points/s per instrument')
+    for batch in (False, True):
+        n_points, elapsed, cpu = run_manager(batch)
+        print(f'manager batch={batch!s:5}: {n_points} points in {elapsed:.2f} s '
+              f'({n_points / elapsed:.0f} points/s), cpu {cpu / elapsed * 100:.0f}%')
+    for n_instruments in (1, 2, 4):
+        n_points, elapsed, n_results = run_pool(n_instruments)
+        print(f'pool {n_instruments} instruments: {n_points} points in {elapsed:.2f} s '
+              f'({n_points / elapsed:.0f} points/s), {n_results} measurements')
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Time from the last point of a scan to its feature vector: features accumulated while the
+# points arrive (ScanBuffer(features=True)) against extracting them from the complete scan.
+# Points are added one at a time (per point callback) and in chunks (batch callback).
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+import dpv_features
+from scan_buffer import ScanBuffer
+from bench_dpv_features import synthetic_scans
+
+n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+chunk = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+repeat = 20
+
+
+def stream(voltage, current, size):
+    buffer = ScanBuffer(len(voltage), features=True)
+    start = time.perf_counter()
+    for i in range(0, len(voltage), size):
+        buffer.extend(voltage[i:i + size], current[i:i + size])
+    added = time.perf_counter()
+    features = buffer.features.features()
+    return features, added - start, time.perf_counter() - added
+
+
+if __name__ == '__main__':
+    voltage, current = synthetic_scans(repeat, n_points)
+    reference = dpv_features.extract_features_batch(voltage, current)
+
+    results = {}
+    for size in (1, chunk):
+        add_time = final_time = error = 0.0
+        for i in range(repeat):
+            features, added, final = stream(voltage, current[i], size)
+            add_time += added / repeat
+            final_time += final / repeat
+            error = max(error, np.max(np.abs(features - reference[i]) / np.maximum(np.abs(reference[i]), 1e-12)))
+        results[size] = (add_time, final_time, error)
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        dpv_features.extract_features(pd.DataFrame({'Voltage': voltage, 'Current': current[i]}))
+    full_time = (time.perf_counter() - start) / repeat
+
+    print(f'{n_points} points per scan')
+    for size, (add_time, final_time, error) in results.items():
+        print(f'streamed, chunks of {size:4d}: {1e6 * final_time:8.1f} us after the last point '
+              f'({1e6 * add_time / n_points:.1f} us per point while scanning), max relative difference {error:.2e}')
+    print(f'extracted from the complete scan: {1e6 * full_time:8.1f} us after the last point')
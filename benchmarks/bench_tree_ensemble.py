@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+# Compares sklearn's predict with tree_ensemble.PackedEnsemble for a random forest and a gradient
+# boosting model trained on new_data.csv: the latency of one scan (as in the GUI) and the throughput
+# for 10k scans, and checks that both give identical predictions.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from tree_ensemble import pack
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+n_scans = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+if __name__ == '__main__':
+    data = pd.read_csv(os.path.join(root, 'new_data.csv'))
+    X = data.drop(columns='Concentration')
+    y = data['Concentration']
+    rng = np.random.default_rng(0)
+    # rows drawn around the training data, scaled per feature
+    X_test = pd.DataFrame(X.to_numpy()[rng.integers(0, len(X), n_scans)] * rng.normal(1, 0.1, (n_scans, X.shape[1])),
+                          columns=X.columns)
+    one = X_test.iloc[:1]
+
+    for model in (RandomForestRegressor(n_estimators=100, random_state=42),
+                  GradientBoostingRegressor(n_estimators=100, random_state=42)):
+        model.fit(X, y)
+        packed = pack(model)
+        expected = model.predict(X_test)
+        result = packed.predict(X_test)
+        single = best_time(lambda: model.predict(one), 200)
+        single_packed = best_time(lambda: packed.predict(one), 200)
+        batch = best_time(lambda: model.predict(X_test), 5)
+        batch_packed = best_time(lambda: packed.predict(X_test), 5)
+        print(f'{type(model).__name__}: {packed.n_estimators} trees, {len(packed.feature)} nodes, depth {packed.max_depth}, '
+              f'identical: {np.array_equal(expected, result)}')
+        print(f'  one scan:   sklearn {1e3 * single:8.3f} ms, packed {1e3 * single_packed:8.3f} ms ({single / single_packed:.1f}x)')
+        print(f'  {n_scans} scans: sklearn {1e3 * batch:8.1f} ms, packed {1e3 * batch_packed:8.1f} ms '
+              f'({n_scans / batch_packed:.0f} scans/s, {batch / batch_packed:.1f}x)')
@@ -0,0 +1,97 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import numpy as np
+
+# Load generator for prediction_server.py. Every client thread sends one scan per request
+# (synthetic DPV scans) over a persistent connection for the given duration, then the client
+# side latencies are printed next to the /stats of the server.
+#
+#   python prediction_server.py --model rf_model.pkl &
+#   python benchmarks/load_prediction_server.py --clients 16 --duration 10
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from bench_dpv_features import synthetic_scans
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def connect(args):
+    if args.unix:
+        return UnixHTTPConnection(args.unix)
+    return http.client.HTTPConnection(args.host, args.port, timeout=30)
+
+
+def request(connection, method, path, document=None):
+    body = json.dumps(document).encode('utf-8') if document is not None else None
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    data = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(data.get('error', response.status))
+    return data
+
+
+def client(args, bodies, stop, latencies, errors):
+    connection = connect(args)
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            request(connection, 'POST', '/predict', bodies[i % len(bodies)])
+        except Exception:
+            errors.append(1)
+            connection.close()
+            connection = connect(args)
+        else:
+            latencies.append(time.perf_counter() - start)
+        i += 1
+    connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send concurrent single scan requests to prediction_server.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='Unix socket of the server')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--points', type=int, default=99, help='points per scan')
+    args = parser.parse_args()
+
+    voltage, current = synthetic_scans(64, args.points)
+    bodies = [{'voltage': voltage.tolist(), 'current': c.tolist()} for c in current]
+
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(args, bodies, stop, latencies, errors)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000.0 if latencies else (np.nan, np.nan)
+    print(f'{args.clients} clients, {len(latencies)} requests in {elapsed:.1f} s: {len(latencies) / elapsed:.1f} scans/s, '
+          f'p50 {p50:.2f} ms, p99 {p99:.2f} ms, {len(errors)} errors')
+    connection = connect(args)
+    print('server:', json.dumps(request(connection, 'GET', '/stats'), indent=2))
+    connection.close()
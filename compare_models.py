@@ -0,0 +1,249 @@
+# compare_models.py
+
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import (
+    mean_squared_error,
+    r2_score,
+    confusion_matrix,
+    precision_score,
+    recall_score,
+    fbeta_score,
+)
+
+try:
+    from xgboost import XGBRegressor
+except ImportError:
+    XGBRegressor = None
+
+
+def make_model(name, seed):
+    """
+    The models of the comparison in creatanine.py by name, seeded with seed. Every worker fits one
+    model at a time, so the models themselves use a single core.
+    """
+    if name == "Random Forest":
+        return RandomForestRegressor(n_estimators=100, random_state=seed, n_jobs=1)
+    if name == "Gradient Boosting":
+        return GradientBoostingRegressor(n_estimators=100, random_state=seed)
+    if name == "XGBoost":
+        if XGBRegressor is None:
+            raise ImportError("XGBoost is not installed")
+        return XGBRegressor(n_estimators=100, random_state=seed, n_jobs=1)
+    if name == "KNN":
+        return KNeighborsRegressor(n_neighbors=5)
+    raise ValueError(f"Unknown model '{name}'")
+
+
+def configure_model(estimator, seed):
+    # An unfitted copy of an estimator from the caller, seeded and on a single core like make_model
+    model = clone(estimator)
+    params = model.get_params()
+    model.set_params(**{key: value for key, value in (('random_state', seed), ('n_jobs', 1)) if key in params})
+    return model
+
+
+MODEL_NAMES = ["Random Forest", "Gradient Boosting", "XGBoost", "KNN"]
+RATIOS = [0.5, 0.6, 0.7, 0.8]
+
+
+def regression_metrics(y_test, y_pred):
+    """
+    MSE and R² of the predictions, and precision, recall, specificity and F2 of the rounded
+    concentrations treated as classes, computed like in creatanine.py. Returns (metrics, confusion matrix).
+    """
+    y_pred_rounded = np.round(y_pred)
+    y_test_rounded = np.round(y_test)
+    cm = confusion_matrix(y_test_rounded, y_pred_rounded)
+    tn = cm.sum() - (cm.sum(axis=0) + cm.sum(axis=1) - np.diag(cm)).sum()
+    fp = cm.sum(axis=0) - np.diag(cm)
+    specificity = (tn / (tn + fp.sum())).mean() if (tn + fp.sum()).mean() > 0 else 0
+    metrics = {
+        "MSE": mean_squared_error(y_test, y_pred),
+        "R²": r2_score(y_test, y_pred),
+        "Precision": precision_score(y_test_rounded, y_pred_rounded, average='weighted', zero_division=0),
+        "Recall": recall_score(y_test_rounded, y_pred_rounded, average='weighted', zero_division=0),
+        "Specificity": specificity,
+        "F2-Score": fbeta_score(y_test_rounded, y_pred_rounded, beta=2, average='weighted', zero_division=0),
+    }
+    return metrics, cm
+
+
+def evaluate(X, y, name, ratio, seed, plot_dir=None, estimator=None):
+    # One cell of the grid, runs in a worker process
+    start = time.perf_counter()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=1 - ratio, random_state=seed)
+    model = make_model(name, seed) if estimator is None else configure_model(estimator, seed)
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    metrics, cm = regression_metrics(y_test, y_pred)
+    row = {"Model": name, "Train-Test Ratio": ratio, "Seed": seed, **metrics,
+           "Seconds": time.perf_counter() - start}
+    if plot_dir:
+        title = f"{name} (Train-Test Ratio: {ratio}, Seed: {seed})"
+        stem = os.path.join(plot_dir, f"{name.replace(' ', '_')}_{ratio}_{seed}")
+        save_confusion_matrix(cm, f"Confusion Matrix for {title}", stem + "_confusion.png")
+        save_scatter(y_test, y_pred, f"Actual vs Predicted Values for {title}", stem + "_scatter.png")
+    return row
+
+
+def save_confusion_matrix(cm, title, path):
+    figure, ax = _figure()
+    image = ax.imshow(cm, cmap='Blues')
+    for (i, j), count in np.ndenumerate(cm):
+        ax.text(j, i, str(count), ha='center', va='center',
+                color='white' if count > cm.max() / 2 else 'black')
+    figure.colorbar(image, ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel("Predicted")
+    ax.set_ylabel("Actual")
+    figure.savefig(path)
+
+
+def save_scatter(y_test, y_pred, title, path):
+    figure, ax = _figure()
+    ax.scatter(y_test, y_pred, alpha=0.6, color='blue', label='Predicted vs Actual')
+    ax.plot([np.min(y_test), np.max(y_test)], [np.min(y_test), np.max(y_test)], color='red', linestyle='--', label='Ideal Fit')
+    ax.set_title(title)
+    ax.set_xlabel("Actual Concentration")
+    ax.set_ylabel("Predicted Concentration")
+    ax.legend()
+    ax.grid(alpha=0.3)
+    figure.savefig(path)
+
+
+def save_r2_summary(results, path):
+    # mean R² over the seeds per model and ratio, as grouped bars
+    summary = results.groupby(["Model", "Train-Test Ratio"])["R²"].mean().unstack()
+    figure, ax = _figure(figsize=(12, 8))
+    width = 0.8 / len(summary.columns)
+    positions = np.arange(len(summary.index))
+    for k, ratio in enumerate(summary.columns):
+        ax.bar(positions + k * width - 0.4 + width / 2, summary[ratio], width, label=str(ratio))
+    ax.set_xticks(positions)
+    ax.set_xticklabels(summary.index)
+    ax.set_title("R² Scores Across Models and Train-Test Ratios")
+    ax.set_ylabel("R² Score")
+    ax.set_xlabel("Model")
+    ax.legend(title="Train-Test Ratio")
+    figure.savefig(path)
+
+
+def _figure(figsize=(8, 6)):
+    # Figures drawn with the Agg canvas directly, they never need a display or an event loop
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+
+def _init_worker():
+    # in case a model or plot goes through pyplot
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def compare(X, y, models=MODEL_NAMES, ratios=RATIOS, seeds=(42,), workers=None, plot_dir=None, progress=None):
+    """
+    Fits every model for every train-test ratio and seed in a pool of worker processes (default
+    os.cpu_count(), workers=1 fits them in this process) and returns one table with the metrics of
+    every cell. Scripts that call it must do so under if __name__ == '__main__', the workers import
+    the script again when they are started with spawn (the default on Windows and macOS). models is a list of the
+    names of make_model, or a dict of names and unfitted estimators, which are cloned for every cell
+    with random_state set to the seed and n_jobs to 1. Cells that fail, e.g. a model that is not
+    installed, are left out and reported through progress, or in a warning without it. If every cell
+    fails a RuntimeError is raised.
+    progress: optional callback(done, total, row or exception).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    estimators = models if isinstance(models, dict) else dict.fromkeys(models)
+    if plot_dir:
+        os.makedirs(plot_dir, exist_ok=True)
+    grid = [(name, ratio, seed) for name in estimators for ratio in ratios for seed in seeds]
+    rows = []
+    failed = []
+    for done, (cell, result) in enumerate(_evaluate_grid(X, y, grid, estimators, plot_dir, workers)):
+        if isinstance(result, Exception):
+            failed.append((*cell, result))
+        else:
+            rows.append(result)
+        if progress is not None:
+            progress(done + 1, len(grid), result)
+    if failed and not rows:
+        raise RuntimeError(f"All {len(grid)} fits failed, the first with: {failed[0][3]}") from failed[0][3]
+    if failed and progress is None:
+        warnings.warn(f"{len(failed)} of {len(grid)} fits failed and are left out: "
+                      + "; ".join(f"{name}, ratio {ratio}, seed {seed}: {e}" for name, ratio, seed, e in failed))
+    results = pd.DataFrame(rows)
+    if len(results):
+        order = {name: i for i, name in enumerate(estimators)}
+        results = results.sort_values(["Model", "Train-Test Ratio", "Seed"],
+                                      key=lambda c: c.map(order) if c.name == "Model" else c, ignore_index=True)
+    return results
+
+
+def _evaluate_grid(X, y, grid, estimators, plot_dir, workers):
+    # Yields ((name, ratio, seed), row or exception) in order of completion
+    if workers == 1:
+        for name, ratio, seed in grid:
+            try:
+                yield (name, ratio, seed), evaluate(X, y, name, ratio, seed, plot_dir, estimators[name])
+            except Exception as e:
+                yield (name, ratio, seed), e
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(evaluate, X, y, name, ratio, seed, plot_dir, estimators[name]): (name, ratio, seed)
+                   for name, ratio, seed in grid}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+def _print_progress(done, total, result):
+    if isinstance(result, Exception):
+        print(f"[{done}/{total}] failed: {result}")
+    else:
+        print(f"[{done}/{total}] {result['Model']}, ratio {result['Train-Test Ratio']}, seed {result['Seed']}: "
+              f"R² {result['R²']:.4f} ({result['Seconds']:.2f} s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the regression models over train-test ratios and seeds without a display')
+    parser.add_argument('--data', default='new_data.csv', help='feature table with a Concentration column')
+    parser.add_argument('--raw', nargs='*', default=None, help='raw scan files to featurize (cached) instead of --data')
+    parser.add_argument('--models', nargs='*', default=MODEL_NAMES)
+    parser.add_argument('--ratios', nargs='*', type=float, default=RATIOS, help='fractions used for training')
+    parser.add_argument('--seeds', nargs='*', type=int, default=[42])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='model_performance_comparison.csv')
+    parser.add_argument('--plots', default=None, help='directory for the confusion matrix, scatter and R² plots')
+    args = parser.parse_args()
+
+    if args.raw:
+        from feature_cache import load_training_set
+        X, y = load_training_set(args.raw)
+    else:
+        data = pd.read_csv(args.data)
+        X = data.drop(columns=["Concentration"])
+        y = data["Concentration"]
+
+    start = time.perf_counter()
+    results = compare(X, y, args.models, args.ratios, args.seeds, args.workers, args.plots, _print_progress)
+    elapsed = time.perf_counter() - start
+    results.round(4).to_csv(args.output, index=False)
+    if args.plots and len(results):
+        save_r2_summary(results, os.path.join(args.plots, "r2_summary.png"))
+    print(results.drop(columns="Seconds").round(4).to_string(index=False))
+    print(f"{len(results)} fits in {elapsed:.1f} s, saved to {args.output}")
@@ -17,6 +17,10 @@ from sklearn.neighbors import KNeighborsRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 from xgboost import XGBRegressor
 import numpy as np
+import compare_models
+import dpv_features
+import feature_cache
+import feature_table
 
 # Step 2: Load the CSV file
 # Replace 'data.csv' with the path if it's different
@@ -227,34 +231,13 @@ from scipy.stats import skew
 
 # Function to calculate the necessary features for each concentration
 def extract_features(data):
-    # Initialize a dictionary to store extracted features
-    features = {}
-
-    # Extract Peak Height (max current value)
-    features['Peak_Height'] = data['Current'].max()
-
-    # Extract Peak Potential (corresponding voltage to Peak Height)
-    peak_idx = data['Current'].idxmax()
-    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
-
-    # Calculate Area Under Curve using trapezoidal rule
-    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
-
-    # Calculate Mean Current
-    features['Mean_Current'] = data['Current'].mean()
-
-    # Calculate Standard Deviation of Current
-    features['Std_Current'] = data['Current'].std()
-
-    # Calculate Skewness of Current
-    features['Skew_Current'] = skew(data['Current'])
-
-    return features
+    # see dpv_features.py, the features of data.csv
+    return dpv_features.extract_features(data, dpv_features.BASIC_FEATURES)
 
 # Function to process the dataset and extract features for each concentration
 def process_data(input_file, concentration_range):
-    # Read the CSV file
-    df = pd.read_csv(input_file)
+    # Read the header of the CSV file, the data is only read when its features are not cached
+    df = pd.read_csv(input_file, nrows=0)
 
     # Clean up column names by removing leading/trailing spaces if any
     df.columns = df.columns.str.strip()
@@ -265,22 +248,15 @@ def process_data(input_file, concentration_range):
         print("Available columns:", df.columns)
         return
 
-    # Create an empty list to store all rows of the output
-    output_data = []
-
-    # Process data for each concentration in the given range
-    for concentration in concentration_range:
-        concentration_data = df[df['Concentration'] == concentration]
-
-        # Extract features for the current concentration
-        features = extract_features(concentration_data)
-        features['Concentration'] = concentration
-
-        # Append the features along with concentration to the output data
-        output_data.append(features)
-
-    # Convert the output data to a DataFrame
-    output_df = pd.DataFrame(output_data)
+    # Extract the features of every concentration, the rows are sorted once and each concentration
+    # is a slice of them (see feature_table.py). The result is cached by the content of the file
+    # (see feature_cache.py), then keep the concentrations of the given range in its order
+    features_df = feature_cache.load_features(input_file, 'Concentration', dpv_features.BASIC_FEATURES)
+    missing = [c for c in concentration_range if c not in set(features_df['Concentration'])]
+    if missing:
+        print("Warning: no data for the concentrations", missing)
+    output_df = features_df.set_index('Concentration').reindex(list(concentration_range))
+    output_df = output_df.rename_axis('Concentration').reset_index()[list(features_df.columns)]
 
     # Save the output to a new CSV file
     output_df.to_csv('processed_data.csv', index=False)
@@ -324,57 +300,8 @@ from scipy.stats import skew, kurtosis
 
 # Function to calculate the necessary features for each concentration
 def extract_features(data):
-    features = {}
-
-    # Extract Peak Height (maximum current)
-    features['Peak_Height'] = data['Current'].max()
-
-    # Extract Peak Potential (Voltage corresponding to Peak Height)
-    peak_idx = data['Current'].idxmax()
-    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
-
-    # Calculate Area Under Curve using trapezoidal rule
-    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
-
-    # Calculate Mean Current
-    features['Mean_Current'] = data['Current'].mean()
-
-    # Calculate Standard Deviation of Current
-    features['Std_Current'] = data['Current'].std()
-
-    # Calculate Skewness of Current
-    features['Skew_Current'] = skew(data['Current'])
-
-    # Calculate Kurtosis of Current
-    features['Kurtosis_Current'] = kurtosis(data['Current'])
-
-    # Calculate Voltage Range (max voltage - min voltage)
-    features['Voltage_Range'] = data['Voltage'].max() - data['Voltage'].min()
-
-    # Calculate Voltage Centroid (Weighted average of voltage)
-    features['Voltage_Centroid'] = (data['Voltage'] * data['Current']).sum() / data['Current'].sum()
-
-    # Calculate Signal-to-Noise Ratio (SNR) as peak current divided by std of current
-    features['SNR'] = features['Peak_Height'] / features['Std_Current']
-
-    # Calculate Full Width at Half Maximum (FWHM)
-    half_max = features['Peak_Height'] / 2
-    half_max_indices = np.where(data['Current'] >= half_max)[0]
-    if len(half_max_indices) >= 2:
-        fwhm_voltage_range = data['Voltage'].iloc[half_max_indices[-1]] - data['Voltage'].iloc[half_max_indices[0]]
-    else:
-        fwhm_voltage_range = 0
-    features['FWHM'] = fwhm_voltage_range
-
-    # Calculate Derivatives: dI/dV and d²I/dV² (First and Second Derivatives)
-    data['dI/dV'] = np.gradient(data['Current'], data['Voltage'])
-    data['d2I/dV2'] = np.gradient(data['dI/dV'], data['Voltage'])
-
-    # Maximum values of derivatives
-    features['Max_dI/dV'] = data['dI/dV'].max()
-    features['Max_d2I/dV2'] = data['d2I/dV2'].max()
-
-    return features
+    # see dpv_features.py, all features
+    return dpv_features.extract_features(data, dpv_features.FEATURE_NAMES)
 
 # Load dataset
 data = pd.read_csv("new_data.csv")  # Replace with your file path
@@ -391,75 +318,25 @@ models = {
 
 # Train-Test Ratios
 ratios = [0.5, 0.6, 0.7, 0.8]
-metrics_df = pd.DataFrame()
-
-# Iterate over train-test ratios and models
-for ratio in ratios:
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=1 - ratio, random_state=42)
-
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
-
-        # Compute Metrics
-        mse = mean_squared_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
-        y_pred_rounded = np.round(y_pred)
-        y_test_rounded = np.round(y_test)
-        cm = confusion_matrix(y_test_rounded, y_pred_rounded)
-        precision = precision_score(y_test_rounded, y_pred_rounded, average='weighted', zero_division=0)
-        recall = recall_score(y_test_rounded, y_pred_rounded, average='weighted', zero_division=0)
-        f2_score = fbeta_score(y_test_rounded, y_pred_rounded, beta=2, average='weighted', zero_division=0)
-
-        # Specificity Calculation
-        tn = cm.sum() - (cm.sum(axis=0) + cm.sum(axis=1) - np.diag(cm)).sum()
-        fp = cm.sum(axis=0) - np.diag(cm)
-        specificity = (tn / (tn + fp.sum())).mean() if (tn + fp.sum()).mean() > 0 else 0
-
-        # Append results to DataFrame
-        new_row = pd.DataFrame([{
-            "Model": name,
-            "Train-Test Ratio": ratio,
-            "MSE": mse,
-            "R²": r2,
-            "Precision": precision,
-            "Recall": recall,
-            "Specificity": specificity,
-            "F2-Score": f2_score
-        }])
-        metrics_df = pd.concat([metrics_df, new_row], ignore_index=True)
-
-        # Plot Confusion Matrix
-        plt.figure(figsize=(8, 6))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-        plt.title(f"Confusion Matrix for {name} (Train-Test Ratio: {ratio})")
-        plt.xlabel("Predicted")
-        plt.ylabel("Actual")
-        plt.show()
-
-        # Actual vs Predicted Scatter Plot
-        plt.figure(figsize=(8, 6))
-        plt.scatter(y_test, y_pred, alpha=0.6, color='blue', label='Predicted vs Actual')
-        plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], color='red', linestyle='--', label='Ideal Fit')
-        plt.title(f"Actual vs Predicted Values for {name} (Train-Test Ratio: {ratio})")
-        plt.xlabel("Actual Concentration")
-        plt.ylabel("Predicted Concentration")
-        plt.legend()
-        plt.grid(alpha=0.3)
-        plt.show()
-
-# Display metrics as a table
-metrics_df = metrics_df.round(4)
-print(metrics_df)
-
-# Visualize Metrics
-plt.figure(figsize=(12, 8))
-sns.barplot(data=metrics_df, x="Model", y="R²", hue="Train-Test Ratio", ci=None)
-plt.title("R² Scores Across Models and Train-Test Ratios")
-plt.ylabel("R² Score")
-plt.xlabel("Model")
-plt.legend(title="Train-Test Ratio")
-plt.show()
+# The worker processes import this script again when they are started with spawn (the default
+# on Windows and macOS), the comparison only runs in the main process
+if __name__ == '__main__':
+    # Fit every model for every ratio in worker processes. The confusion matrices and scatter
+    # plots are saved to comparison_plots/ instead of being shown one by one (see compare_models.py)
+    metrics_df = compare_models.compare(X, y, models, ratios, seeds=[42], plot_dir="comparison_plots")
+
+    # Display metrics as a table
+    metrics_df = metrics_df.round(4)
+    print(metrics_df)
+
+    # Visualize Metrics
+    plt.figure(figsize=(12, 8))
+    sns.barplot(data=metrics_df, x="Model", y="R²", hue="Train-Test Ratio", ci=None)
+    plt.title("R² Scores Across Models and Train-Test Ratios")
+    plt.ylabel("R² Score")
+    plt.xlabel("Model")
+    plt.legend(title="Train-Test Ratio")
+    plt.show()
 
 import pandas as pd
 import numpy as np
@@ -473,16 +350,8 @@ from google.colab import files
 
 # Function to calculate the necessary features for each concentration
 def extract_features(data):
-    data.rename(columns={'Voltage (V)': 'Voltage', 'Current (A)': 'Current'}, inplace=True)
-    features = {}
-    features['Peak_Height'] = data['Current'].max()
-    peak_idx = data['Current'].idxmax()
-    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
-    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
-    features['Mean_Current'] = data['Current'].mean()
-    features['Std_Current'] = data['Current'].std()
-    features['Skew_Current'] = skew(data['Current'])
-    return features
+    # see dpv_features.py, the features of data.csv
+    return dpv_features.extract_features(data, dpv_features.BASIC_FEATURES)
 
 # Load the dataset
 data = pd.read_csv("processed_data.csv")
@@ -608,29 +477,8 @@ from google.colab import files
 
 # Function to calculate the necessary features for each concentration
 def extract_features(data):
-    # Initialize a dictionary to store extracted features
-    features = {}
-
-    # Extract Peak Height (max current value)
-    features['Peak_Height'] = data['Current'].max()
-
-    # Extract Peak Potential (corresponding voltage to Peak Height)
-    peak_idx = data['Current'].idxmax()
-    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
-
-    # Calculate Area Under Curve using trapezoidal rule
-    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
-
-    # Calculate Mean Current
-    features['Mean_Current'] = data['Current'].mean()
-
-    # Calculate Standard Deviation of Current
-    features['Std_Current'] = data['Current'].std()
-
-    # Calculate Skewness of Current
-    features['Skew_Current'] = skew(data['Current'])
-
-    return features
+    # see dpv_features.py, the features of data.csv
+    return dpv_features.extract_features(data, dpv_features.BASIC_FEATURES)
 
 # Load the training dataset
 train_data = pd.read_csv("processed_data.csv")
@@ -708,82 +556,26 @@ from scipy.stats import skew, kurtosis
 
 # Function to calculate features from DPV data
 def extract_features(data):
-    features = {}
-
-    # Extract Peak Height (maximum current)
-    features['Peak_Height'] = data['Current'].max()
-
-    # Extract Peak Potential (Voltage corresponding to Peak Height)
-    peak_idx = data['Current'].idxmax()
-    features['Peak_Potential'] = data.loc[peak_idx, 'Voltage']
-
-    # Calculate Area Under Curve using trapezoidal rule
-    features['Area_Under_Curve'] = trapz(data['Current'], data['Voltage'])
-
-    # Calculate Mean Current
-    features['Mean_Current'] = data['Current'].mean()
-
-    # Calculate Standard Deviation of Current
-    features['Std_Current'] = data['Current'].std()
-
-    # Calculate Skewness of Current
-    features['Skew_Current'] = skew(data['Current'])
-
-    # Calculate Kurtosis of Current
-    features['Kurtosis_Current'] = kurtosis(data['Current'])
-
-    # Calculate Voltage Range
-    features['Voltage_Range'] = data['Voltage'].max() - data['Voltage'].min()
-
-    # Calculate Voltage Centroid
-    features['Voltage_Centroid'] = (data['Voltage'] * data['Current']).sum() / data['Current'].sum()
-
-    # Calculate Signal-to-Noise Ratio (SNR)
-    features['SNR'] = data['Current'].max() / data['Current'].std()
-
-    # Calculate Full Width at Half Maximum (FWHM)
-    half_max = data['Current'].max() / 2
-    half_max_indices = np.where(data['Current'] >= half_max)[0]
-    if len(half_max_indices) >= 2:
-        fwhm_voltage_range = data['Voltage'].iloc[half_max_indices[-1]] - data['Voltage'].iloc[half_max_indices[0]]
-    else:
-        fwhm_voltage_range = 0
-    features['FWHM'] = fwhm_voltage_range
-
-    # Calculate Derivatives
-    data['dI/dV'] = np.gradient(data['Current'], data['Voltage'])
-    data['d2I/dV2'] = np.gradient(data['dI/dV'], data['Voltage'])
-    features['Max_dI/dV'] = data['dI/dV'].max()
-    features['Max_d2I/dV2'] = data['d2I/dV2'].max()
-
-    return features
+    # see dpv_features.py, all features
+    return dpv_features.extract_features(data, dpv_features.FEATURE_NAMES)
 
 # Main function to process the CSV file and calculate features
 def process_file(input_file, output_file="new_data.csv"):
-    # Load the input CSV file
-    df = pd.read_csv(input_file)
+    # Load the header of the input CSV file
+    df = pd.read_csv(input_file, nrows=0)
 
     # Validate required columns
     required_columns = ['Voltage', 'Current', 'Concentration']
     if not all(col in df.columns for col in required_columns):
         raise ValueError(f"The input file must contain the following columns: {required_columns}")
 
-    # Prepare output data
-    output_data = []
-
-    # Group data by concentration
-    for concentration, group_data in df.groupby('Concentration'):
-        # Extract features for each concentration group
-        features = extract_features(group_data)
-        features['Concentration'] = concentration
-        output_data.append(features)
-
-    # Create a DataFrame for the features
-    features_df = pd.DataFrame(output_data)
+    # Extract the features of each concentration group, in worker processes for large files,
+    # unless this file was featurized before (see feature_cache.py)
+    features_df = feature_cache.load_features(input_file, 'Concentration', dpv_features.FEATURE_NAMES)
 
-    # Save the features to a new CSV file
-    features_df.to_csv(output_file, index=False)
-    print(f"Features have been successfully saved to {output_file}")
+    # Save the features to a new CSV file and a binary columnar copy (.npz)
+    csv_file, binary_file = feature_table.write_table(features_df, output_file)
+    print(f"Features have been successfully saved to {csv_file} and {binary_file}")
 
     # Prompt download if in a notebook environment
     try:
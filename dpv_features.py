@@ -0,0 +1,301 @@
+# dpv_features.py
+
+import numpy as np
+import pandas as pd
+
+# Features of a DPV scan, in the column order of new_data.csv
+FEATURE_NAMES = ['Peak_Height', 'Peak_Potential', 'Area_Under_Curve', 'Mean_Current', 'Std_Current',
+                 'Skew_Current', 'Kurtosis_Current', 'Voltage_Range', 'Voltage_Centroid', 'SNR', 'FWHM',
+                 'Max_dI/dV', 'Max_d2I/dV2']
+# The subset used by data.csv and the models trained on it
+BASIC_FEATURES = FEATURE_NAMES[:6]
+# Increase when the definition of a feature changes, cached feature matrices are then recomputed
+FEATURE_SET_VERSION = 3
+
+# Column names used by the different exports of a scan
+VOLTAGE_COLUMNS = ('Voltage', 'Voltage (V)')
+CURRENT_COLUMNS = ('Current', 'Current (A)')
+
+
+def extract_features_batch(voltage, current):
+    """
+    Computes all features for N scans of M points at once. current is an (N, M) array (or a
+    single scan of M points), voltage has the same shape or is one (M,) grid shared by all scans.
+    The inputs are not copied or modified. Returns an (N, len(FEATURE_NAMES)) float64 array.
+
+    The results match the per scan pandas implementation in creatanine.py: the standard deviation
+    uses ddof=1, skewness and kurtosis are the biased (scipy default) estimates, FWHM is the voltage
+    span between the first and last point at or above half the peak height, and the derivatives
+    are np.gradient with the voltage as (non-uniform) coordinates. Like Series.max the peak and the
+    derivative maxima skip NaN, e.g. the derivatives at a repeated voltage or a CV turning point.
+    """
+    current = np.asarray(current, dtype=np.float64)
+    voltage = np.asarray(voltage, dtype=np.float64)
+    if current.ndim == 1:
+        current = current[np.newaxis, :]
+    if voltage.ndim == 1:
+        voltage = voltage[np.newaxis, :]
+    n_scans, n_points = current.shape
+    if voltage.shape[-1] != n_points or voltage.shape[0] not in (1, n_scans):
+        raise ValueError(f"voltage {voltage.shape} does not match current {current.shape}")
+    if n_points < 2:
+        raise ValueError("Scans need at least 2 points")
+
+    rows = np.arange(n_scans)
+    features = np.empty((n_scans, len(FEATURE_NAMES)), dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # peak, the first maximum like DataFrame.idxmax, NaN only when the whole scan is NaN
+        peak_height = np.fmax.reduce(current, axis=1)
+        peak_idx = np.where(np.isnan(current), -np.inf, current).argmax(axis=1)
+        peak_potential = voltage[rows if voltage.shape[0] > 1 else 0, peak_idx]
+        peak_potential = np.where(np.isnan(peak_height), np.nan, peak_potential)
+
+        # moments from the deviations of the mean
+        mean = current.mean(axis=1)
+        deviation = current - mean[:, np.newaxis]
+        squared = deviation * deviation
+        m2 = squared.mean(axis=1)
+        m3 = np.einsum('ij,ij->i', squared, deviation) / n_points
+        m4 = np.einsum('ij,ij->i', squared, squared) / n_points
+        std = np.sqrt(m2 * n_points / (n_points - 1))
+        degenerate = m2 <= (np.finfo(np.float64).resolution * mean) ** 2  # like scipy.stats
+        skew = np.where(degenerate, np.nan, m3 / m2 ** 1.5)
+        kurtosis = np.where(degenerate, np.nan, m4 / m2 ** 2 - 3.0)
+
+        # trapezoid area and centroid
+        dv = np.diff(voltage, axis=1)
+        area = np.einsum('ij,ij->i', np.broadcast_to(dv, (n_scans, n_points - 1)),
+                         current[:, 1:] + current[:, :-1]) / 2.0
+        centroid = np.einsum('ij,ij->i', np.broadcast_to(voltage, current.shape), current) / current.sum(axis=1)
+        voltage_range = voltage.max(axis=1) - voltage.min(axis=1)
+
+        # full width at half maximum, 0 when no point reaches half the peak (e.g. negative currents)
+        above = current >= (peak_height / 2.0)[:, np.newaxis]
+        has = above.any(axis=1)
+        first = above.argmax(axis=1)
+        last = n_points - 1 - above[:, ::-1].argmax(axis=1)
+        v_rows = rows if voltage.shape[0] > 1 else 0
+        fwhm = np.where(last > first, voltage[v_rows, last] - voltage[v_rows, first], 0.0)
+        fwhm[~has] = 0.0
+
+        # first and second derivative
+        d1 = _gradient(current, voltage, dv)
+        max_d1 = np.fmax.reduce(d1, axis=1)
+        max_d2 = np.fmax.reduce(_gradient(d1, voltage, dv), axis=1)
+        snr = peak_height / std
+
+    features[:, 0] = peak_height
+    features[:, 1] = peak_potential
+    features[:, 2] = area
+    features[:, 3] = mean
+    features[:, 4] = std
+    features[:, 5] = skew
+    features[:, 6] = kurtosis
+    features[:, 7] = voltage_range
+    features[:, 8] = centroid
+    features[:, 9] = snr
+    features[:, 10] = fwhm
+    features[:, 11] = max_d1
+    features[:, 12] = max_d2
+    return features
+
+
+def extract_features_frame(voltage, current, names=FEATURE_NAMES):
+    features = extract_features_batch(voltage, current)
+    columns = [FEATURE_NAMES.index(name) for name in names]
+    return pd.DataFrame(features[:, columns], columns=list(names))
+
+
+def extract_features(data, names=FEATURE_NAMES):
+    """
+    Features of one scan as a dictionary. data is a DataFrame with Voltage and Current columns
+    ('Voltage (V)' and 'Current (A)' are accepted as well), it is not modified.
+    """
+    voltage = _column(data, VOLTAGE_COLUMNS).to_numpy(dtype=np.float64)
+    current = _column(data, CURRENT_COLUMNS).to_numpy(dtype=np.float64)
+    features = extract_features_batch(voltage, current)[0]
+    return {name: float(features[FEATURE_NAMES.index(name)]) for name in names}
+
+
+class FeatureAccumulator:
+    """
+    Computes the features of extract_features_batch while a scan arrives, chunk by chunk, so they
+    are available as soon as the last point is added. Only running values are kept: the peak,
+    trapezoid area, centroid sums, the count, mean and central moment sums (merged per chunk
+    like Welford's algorithm), the prefix and suffix maxima needed for the FWHM and the last
+    few points for the derivatives.
+    """
+    _tail_size = 4  # points of context for the second derivative
+
+    def __init__(self):
+        self.reset()
+
+    def __len__(self):
+        return self.n
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = self.m3 = self.m4 = 0.0
+        self.peak_height = np.nan
+        self.peak_potential = np.nan
+        self.area = 0.0
+        self.weighted_sum = 0.0
+        self.current_sum = 0.0
+        self.v_min = np.inf
+        self.v_max = -np.inf
+        self.max_d1 = self.max_d2 = np.nan  # NaN is skipped by np.fmax like in extract_features_batch
+        self._d1_done = self._d2_done = 0
+        self._tail_v = np.empty(0)
+        self._tail_i = np.empty(0)
+        # (index, voltage, current) of points larger than all before them, and of points
+        # larger than all after them, for the first and last point above half the peak height
+        self._rising = [np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)]
+        self._falling = [np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)]
+
+    def update(self, voltage, current):
+        voltage = np.asarray(voltage, dtype=np.float64).ravel()
+        current = np.asarray(current, dtype=np.float64).ravel()
+        count = len(current)
+        if count == 0:
+            return
+        start = self.n
+
+        # peak, first maximum, NaN is skipped
+        idx = np.where(np.isnan(current), -np.inf, current).argmax()
+        if current[idx] > self.peak_height or (np.isnan(self.peak_height) and not np.isnan(current[idx])):
+            self.peak_height = current[idx]
+            self.peak_potential = voltage[idx]
+
+        # moments of the chunk, merged with the running moments
+        mean_b = current.mean()
+        deviation = current - mean_b
+        squared = deviation * deviation
+        m2_b = squared.sum()
+        m3_b = squared.dot(deviation)
+        m4_b = squared.dot(squared)
+        n_a, n_b = self.n, count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.m4 += (m4_b + delta ** 4 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b) / n ** 3
+                    + 6 * delta ** 2 * (n_a * n_a * m2_b + n_b * n_b * self.m2) / n ** 2
+                    + 4 * delta * (n_a * m3_b - n_b * self.m3) / n)
+        self.m3 += (m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+                    + 3 * delta * (n_a * m2_b - n_b * self.m2) / n)
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+
+        # area, centroid and voltage range, the first trapezoid joins the previous chunk
+        v = np.concatenate((self._tail_v[-1:], voltage))
+        i = np.concatenate((self._tail_i[-1:], current))
+        self.area += np.dot(np.diff(v), i[1:] + i[:-1]) / 2.0
+        self.weighted_sum += voltage.dot(current)
+        self.current_sum += current.sum()
+        self.v_min = min(self.v_min, voltage.min())
+        self.v_max = max(self.v_max, voltage.max())
+
+        # points larger than everything before them
+        previous = np.maximum.accumulate(np.concatenate(([self._rising[2][-1] if len(self._rising[2]) else -np.inf], current)))
+        rising = np.flatnonzero(current > previous[:-1])
+        self._rising = [np.concatenate((a, b)) for a, b in
+                        zip(self._rising, (rising + start, voltage[rising], current[rising]))]
+
+        # points larger than everything after them, earlier points that are not larger than
+        # the chunk maximum drop out
+        following = np.maximum.accumulate(current[::-1])[::-1]
+        falling = np.flatnonzero(current > np.append(following[1:], -np.inf))
+        keep = np.searchsorted(-self._falling[2], -following[0], side='left')
+        self._falling = [np.concatenate((a[:keep], b)) for a, b in
+                         zip(self._falling, (falling + start, voltage[falling], current[falling]))]
+
+        # derivatives of the points that have enough neighbours
+        self._tail_v = np.concatenate((self._tail_v, voltage))
+        self._tail_i = np.concatenate((self._tail_i, current))
+        self.__update_derivatives(final=False)
+        self._tail_v = self._tail_v[-self._tail_size:]
+        self._tail_i = self._tail_i[-self._tail_size:]
+
+    def features(self):
+        # Returns the features in the order of FEATURE_NAMES
+        if self.n < 2:
+            raise ValueError("Scans need at least 2 points")
+        max_d1, max_d2 = self.__update_derivatives(final=True)
+        n = self.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m2 = self.m2 / n
+            std = np.sqrt(self.m2 / (n - 1))
+            degenerate = m2 <= (np.finfo(np.float64).resolution * self.mean) ** 2
+            skew = np.nan if degenerate else (self.m3 / n) / m2 ** 1.5
+            kurtosis = np.nan if degenerate else (self.m4 / n) / m2 ** 2 - 3.0
+            half = self.peak_height / 2.0
+            first = np.searchsorted(self._rising[2], half, side='left')
+            last = np.count_nonzero(self._falling[2] >= half) - 1
+            # no point at or above half the peak, e.g. when all currents are negative
+            if first < len(self._rising[2]) and last >= 0 and self._falling[0][last] > self._rising[0][first]:
+                fwhm = self._falling[1][last] - self._rising[1][first]
+            else:
+                fwhm = 0.0
+            return np.array([self.peak_height, self.peak_potential, self.area, self.mean, std, skew, kurtosis,
+                             self.v_max - self.v_min, self.weighted_sum / self.current_sum,
+                             self.peak_height / std, fwhm, max_d1, max_d2])
+
+    def as_dict(self, names=FEATURE_NAMES):
+        features = self.features()
+        return {name: float(features[FEATURE_NAMES.index(name)]) for name in names}
+
+    def __update_derivatives(self, final):
+        # self._tail_* hold the last points, the first of them has index self.n - len(tail).
+        # The first derivative of a point is known once its next point arrived, the second once
+        # the next two arrived, the end points of the scan use the one sided formulas.
+        v = self._tail_v[np.newaxis, :]
+        i = self._tail_i[np.newaxis, :]
+        length = v.shape[1]
+        offset = self.n - length
+        if length < 2:
+            return self.max_d1, self.max_d2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dv = np.diff(v, axis=1)
+            d1 = _gradient(i, v, dv)[0]
+            d2 = _gradient(d1[np.newaxis, :], v, dv)[0]
+        # valid local positions: the first points are only valid at the start of the scan
+        d1_first = 0 if offset == 0 else 1
+        d2_first = 0 if offset == 0 else 2
+        d1_end = length if final else length - 1
+        d2_end = length if final else length - 2
+        max_d1 = _max_from(d1, max(d1_first, self._d1_done - offset), d1_end, self.max_d1)
+        max_d2 = _max_from(d2, max(d2_first, self._d2_done - offset), d2_end, self.max_d2)
+        if final:
+            return max_d1, max_d2
+        self.max_d1, self.max_d2 = max_d1, max_d2
+        self._d1_done = max(self._d1_done, offset + d1_end)
+        self._d2_done = max(self._d2_done, offset + d2_end)
+        return max_d1, max_d2
+
+
+def _max_from(values, start, end, current_max):
+    if end > start and len(values) >= end:
+        return np.fmax(current_max, np.fmax.reduce(values[start:end]))
+    return current_max
+
+
+def _column(data, names):
+    for name in names:
+        if name in data.columns:
+            return data[name]
+    raise KeyError(f"None of the columns {names} found")
+
+
+def _gradient(values, voltage, dv):
+    # np.gradient(values, voltage) along axis 1 for every row, second order accurate in the interior
+    # and first order at the edges, voltage and dv may have a single row shared by all scans
+    out = np.empty(values.shape, dtype=np.float64)
+    hs = dv[:, :-1]
+    hd = dv[:, 1:]
+    out[:, 1:-1] = (-hd / (hs * (hs + hd)) * values[:, :-2]
+                    + (hd - hs) / (hs * hd) * values[:, 1:-1]
+                    + hs / (hd * (hs + hd)) * values[:, 2:])
+    out[:, 0] = (values[:, 1] - values[:, 0]) / dv[:, 0]
+    out[:, -1] = (values[:, -1] - values[:, -2]) / dv[:, -1]
+    return out
@@ -0,0 +1,113 @@
+# feature_cache.py
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pspython.pspycache as pspycache
+from dpv_features import FEATURE_NAMES, FEATURE_SET_VERSION
+from feature_table import featurize
+
+# Feature matrices of raw training files (rows of Voltage, Current and Concentration, CSV or XLSX),
+# keyed by the content hash of the file, the feature set version and the requested features. Every
+# entry is a .npy file with the features as float64 columns, which is memory-mapped when loaded, and
+# a .json file with the column names, the group values (e.g. the concentrations, which keep their
+# type, or string scan ids) and the source. Changing a file or bumping FEATURE_SET_VERSION in
+# dpv_features.py changes the key, so only those inputs are featurized again.
+# The entries have the same layout as pspycache, the least recently used are evicted like there.
+
+DEFAULT_CACHE_DIR = os.environ.get('CREATININE_FEATURE_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'creatinine', 'features'))
+DEFAULT_MAX_SIZE = 1024 ** 3  # bytes
+
+
+def cache_key(content_hash, group='Concentration', names=FEATURE_NAMES):
+    description = json.dumps([content_hash, FEATURE_SET_VERSION, group, list(names)])
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+def load_features(path, group='Concentration', names=FEATURE_NAMES, cache_dir=DEFAULT_CACHE_DIR,
+                  max_size=DEFAULT_MAX_SIZE, workers=None):
+    """
+    The feature table of a raw training file (see feature_table.featurize), from the cache when the
+    file was featurized before. The returned DataFrame is backed by the memory-mapped cache entry.
+    """
+    entry = os.path.join(cache_dir, cache_key(pspycache.file_hash(path), group, names))
+    matrix, metadata = _read_entry(entry)
+    if matrix is None:
+        table = featurize(_read_raw(path), group, names, workers=workers)
+        _write_entry(entry, table, group, path)
+        pspycache.evict(cache_dir, max_size, keep=entry)
+        matrix, metadata = _read_entry(entry)
+    table = pd.DataFrame(matrix, columns=metadata['columns'], copy=False)
+    table[group] = np.asarray(metadata['keys'], dtype=metadata['keys_dtype'])
+    return table
+
+
+def load_training_set(paths, group='Concentration', names=FEATURE_NAMES, **kwargs):
+    """
+    Features (X) and target (y) of several raw training files, each one cached separately so only
+    new or changed files are featurized.
+    """
+    tables = [load_features(path, group, names, **kwargs) for path in paths]
+    table = pd.concat(tables, ignore_index=True) if len(tables) > 1 else tables[0]
+    return table[list(names)], table[group]
+
+
+def _read_raw(path):
+    if path.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path)
+    df.columns = df.columns.astype(str).str.strip()
+    return df
+
+
+def _read_entry(entry):
+    try:
+        with open(entry + '.json', encoding='utf-8') as f:
+            metadata = json.load(f)
+        matrix = np.load(entry + '.npy', mmap_mode='r')
+    except (OSError, ValueError):
+        return None, None
+    if (metadata.get('version') != FEATURE_SET_VERSION or 'keys' not in metadata
+            or matrix.shape != (len(metadata['keys']), len(metadata['columns']))):
+        return None, None
+    os.utime(entry + '.npy')  # last used, for evict
+    return matrix, metadata
+
+
+def _write_entry(entry, table, group, path):
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    keys = table[group].to_numpy()
+    if keys.dtype.kind not in 'biufU' and not all(isinstance(key, str) for key in keys):
+        raise ValueError(f"The {group} values of {path} must be numbers or strings to be cached")
+    features = table.drop(columns=group)
+    # the .npy file is written first, an entry is only complete once its .json exists
+    with open(entry + '.npy.tmp', 'wb') as f:
+        np.save(f, features.to_numpy(dtype=np.float64))
+    os.replace(entry + '.npy.tmp', entry + '.npy')
+    metadata = {'version': FEATURE_SET_VERSION, 'columns': list(features.columns), 'rows': len(table),
+                'keys': keys.tolist(), 'keys_dtype': str(keys.dtype),
+                'source': os.path.abspath(path), 'created': time.time()}
+    with open(entry + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
+    os.replace(entry + '.json.tmp', entry + '.json')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Featurize raw training files into the feature cache')
+    parser.add_argument('paths', nargs='+', help='CSV or XLSX files with Voltage, Current and Concentration columns')
+    parser.add_argument('--group', default='Concentration')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--output', default=None, help='also write the combined table to this CSV')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    X, y = load_training_set(args.paths, args.group, cache_dir=args.cache_dir)
+    print(f"{len(X)} rows from {len(args.paths)} files in {time.perf_counter() - start:.3f} s")
+    if args.output:
+        X.assign(**{args.group: y}).to_csv(args.output, index=False)
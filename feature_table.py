@@ -0,0 +1,141 @@
+# feature_table.py
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from dpv_features import FEATURE_NAMES, VOLTAGE_COLUMNS, CURRENT_COLUMNS, _column, extract_features_batch
+
+# Files with more rows than this are featurized in worker processes
+PARALLEL_ROWS = 1_000_000
+
+
+def group_offsets(keys):
+    """
+    Sorts the rows by key once. Returns the stable order of the rows, the sorted unique keys and
+    the offsets of their groups in the sorted rows: group k is order[offsets[k]:offsets[k + 1]].
+    Rows without a key (NaN) are left out, like in DataFrame.groupby.
+    """
+    codes, uniques = pd.factorize(np.asarray(keys), sort=True)
+    order = np.argsort(codes, kind='stable')
+    order = order[np.count_nonzero(codes < 0):]
+    offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)), out=offsets[1:])
+    return order, np.asarray(uniques), offsets
+
+
+def featurize_groups(voltage, current, offsets):
+    """
+    Features of the contiguous groups voltage[offsets[k]:offsets[k + 1]]. Groups of the same length
+    are stacked and computed with one call of extract_features_batch. Groups with less than 2 points
+    get NaN features. Returns an (len(offsets) - 1, len(FEATURE_NAMES)) array.
+    """
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    features = np.full((len(starts), len(FEATURE_NAMES)), np.nan)
+    for length in np.unique(lengths[lengths >= 2]):
+        groups = np.flatnonzero(lengths == length)
+        rows = starts[groups, np.newaxis] + np.arange(length)
+        features[groups] = extract_features_batch(voltage[rows], current[rows])
+    return features
+
+
+def featurize(df, group='Concentration', names=FEATURE_NAMES, keys=None, workers=None):
+    """
+    The features of every group of rows of a DataFrame with Voltage, Current and group columns
+    (e.g. the concatenated scans of a calibration), one row per group in the order of the group
+    values, like new_data.csv. keys optionally restricts the output to those group values, one row
+    per key in their order, with NaN features for keys without rows.
+
+    The rows are sorted only once and every group is a slice of the sorted arrays. Frames with more
+    than PARALLEL_ROWS rows are split into blocks of whole groups which are featurized in workers
+    processes (default os.cpu_count()), workers=1 always uses the current process.
+    """
+    voltage = _column(df, VOLTAGE_COLUMNS).to_numpy(dtype=np.float64)
+    current = _column(df, CURRENT_COLUMNS).to_numpy(dtype=np.float64)
+    values = df[group].to_numpy()
+    if keys is not None:
+        selected = np.isin(values, list(keys))
+        voltage, current, values = voltage[selected], current[selected], values[selected]
+
+    order, uniques, offsets = group_offsets(values)
+    voltage = voltage[order]
+    current = current[order]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(order) > PARALLEL_ROWS and len(uniques) > 1:
+        features = _featurize_parallel(voltage, current, offsets, workers)
+    else:
+        features = featurize_groups(voltage, current, offsets)
+
+    columns = [FEATURE_NAMES.index(name) for name in names]
+    table = pd.DataFrame(features[:, columns], columns=list(names))
+    table[group] = uniques
+    if keys is not None:
+        table = table.set_index(group).reindex(list(keys)).rename_axis(group).reset_index()
+        table = table[list(names) + [group]]
+    return table
+
+
+def _featurize_parallel(voltage, current, offsets, workers):
+    # blocks of whole groups with about the same number of rows
+    bounds = np.searchsorted(offsets, np.linspace(0, offsets[-1], workers + 1)[1:-1])
+    bounds = np.unique(np.concatenate(([0], bounds, [len(offsets) - 1])))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            start, stop = offsets[first], offsets[last]
+            futures.append(executor.submit(featurize_groups, voltage[start:stop], current[start:stop],
+                                           offsets[first:last + 1] - start))
+        return np.concatenate([future.result() for future in futures])
+
+
+def write_table(table, path):
+    """
+    Writes a feature table as CSV and next to it in a binary columnar file: .npz with one array
+    per column (the default), or .parquet if path ends with it (needs pyarrow). Returns both paths.
+    """
+    base, extension = os.path.splitext(path)
+    if extension.lower() in ('.npz', '.parquet'):
+        csv_path, binary_path = base + '.csv', path
+    else:
+        csv_path, binary_path = path, base + '.npz'
+    table.to_csv(csv_path, index=False)
+    if binary_path.lower().endswith('.parquet'):
+        table.to_parquet(binary_path, index=False)
+    else:
+        tmp_path = f'{binary_path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, __columns__=np.array(table.columns, dtype=str),
+                 **{f'c{i}': table[c].to_numpy() for i, c in enumerate(table.columns)})
+        os.replace(tmp_path, binary_path)
+    return csv_path, binary_path
+
+
+def read_table(path):
+    # Reads a table written by write_table from its .npz, .parquet or .csv file
+    if path.lower().endswith('.parquet'):
+        return pd.read_parquet(path)
+    if not path.lower().endswith('.npz'):
+        return pd.read_csv(path)
+    with np.load(path, allow_pickle=False) as npz:
+        columns = list(npz['__columns__'])
+        return pd.DataFrame({c: npz[f'c{i}'] for i, c in enumerate(columns)}, columns=columns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute the DPV features of every concentration in a CSV of scans')
+    parser.add_argument('input', help='CSV with Voltage, Current and Concentration columns')
+    parser.add_argument('output', nargs='?', default='new_data.csv', help='CSV to write, a .npz copy is written next to it')
+    parser.add_argument('--group', default='Concentration', help='column that identifies a scan')
+    parser.add_argument('--features', nargs='*', default=FEATURE_NAMES, help='features to compute, in order')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.input)
+    df.columns = df.columns.str.strip()
+    table = featurize(df, args.group, args.features, workers=args.workers)
+    paths = write_table(table, args.output)
+    print(f"{len(table)} groups from {len(df)} rows in {time.perf_counter() - start:.2f} s, saved to {' and '.join(paths)}")
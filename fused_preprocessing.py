@@ -0,0 +1,82 @@
+# fused_preprocessing.py
+
+import numpy as np
+
+
+class PolynomialScaler:
+    """
+    A fitted PolynomialFeatures followed by a fitted StandardScaler as one kernel on float arrays.
+    Every output column is the product of a fixed list of input columns (padded with a column of
+    ones), so the expansion is one gather and one product for any number of rows, followed by the
+    affine scaling. There is no input validation beyond the number of columns and, for DataFrames,
+    the feature names the polynomial features were fitted with, which is what makes single rows
+    fast. The results are identical to poly.transform followed by scaler.transform.
+    """
+    def __init__(self, factors, mean, scale, n_features, feature_names=None):
+        self.factors = factors  # (outputs, degree) input columns, n_features is the column of ones
+        self.mean = mean
+        self.scale = scale
+        self.n_features_in_ = int(n_features)
+        self.feature_names_in_ = feature_names
+
+    def __repr__(self):
+        return f'<PolynomialScaler {self.n_features_in_} -> {len(self.factors)} features>'
+
+    @classmethod
+    def from_sklearn(cls, poly, scaler):
+        n_features = poly.n_features_in_
+        degree = max(int(poly.powers_.sum(axis=1).max()), 1)
+        factors = np.full((len(poly.powers_), degree), n_features, dtype=np.intp)
+        for j, powers in enumerate(poly.powers_):
+            # sklearn multiplies the terms of the previous degree by the lowest column, so the
+            # product starts with the highest column
+            columns = np.repeat(np.arange(n_features), powers)[::-1]
+            factors[j, :len(columns)] = columns
+        n_outputs = len(factors)
+        mean = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else np.zeros(n_outputs)
+        scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_outputs)
+        return cls(factors, np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64),
+                   n_features, getattr(poly, 'feature_names_in_', None))
+
+    def transform(self, X):
+        names = self.feature_names_in_
+        if names is not None and hasattr(X, 'columns') and list(X.columns) != list(names):
+            # like sklearn, which refuses names in another order than in fit
+            raise ValueError(f"The feature names {list(X.columns)} do not match those passed during fit "
+                             f"{list(names)}")
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, expected {self.n_features_in_}")
+        padded = np.empty((len(X), self.n_features_in_ + 1))
+        padded[:, :-1] = X
+        padded[:, -1] = 1.0
+        columns = padded[:, self.factors]
+        out = columns[:, :, 0]
+        for k in range(1, self.factors.shape[1]):
+            out = out * columns[:, :, k]
+        out -= self.mean
+        out /= self.scale
+        return out
+
+
+def fuse(steps):
+    """
+    Replaces every PolynomialFeatures directly followed by a StandardScaler in a list of fitted
+    preprocessing steps with a PolynomialScaler, the other steps are kept as they are.
+    """
+    fused = []
+    i = 0
+    while i < len(steps):
+        if i + 1 < len(steps) and _is_dense_poly(steps[i]) and type(steps[i + 1]).__name__ == 'StandardScaler':
+            fused.append(PolynomialScaler.from_sklearn(steps[i], steps[i + 1]))
+            i += 2
+        else:
+            fused.append(steps[i])
+            i += 1
+    return fused
+
+
+def _is_dense_poly(step):
+    return type(step).__name__ == 'PolynomialFeatures' and hasattr(step, 'powers_')
@@ -0,0 +1,138 @@
+# hyperparameter_search.py
+
+import hashlib
+import json
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import KFold, ParameterSampler
+
+
+class TrialLog:
+    """
+    Completed trials (one candidate, resource and fold each) appended to a JSON lines file as soon as
+    they finish. A search that is started again with the same data, folds and candidates finds its
+    trials in the log and only runs the missing ones.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by an interruption
+                    self.trials[trial['key']] = trial
+
+    def __contains__(self, key):
+        return key in self.trials
+
+    def __getitem__(self, key):
+        return self.trials[key]
+
+    def add(self, trial):
+        self.trials[trial['key']] = trial
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(trial) + '\n')
+
+
+def make_folds(X, y, preprocessing, cv=5, random_state=42):
+    """
+    Splits X into cv folds and fits clones of the preprocessing steps (e.g. poly and scaler) on the
+    training part of every fold. Returns a list of (X_train, y_train, X_test, y_test) with the
+    transformed features, so the transforms are computed once per fold and not per candidate.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    folds = []
+    for train, test in KFold(cv, shuffle=True, random_state=random_state).split(X):
+        X_train, X_test = X[train], X[test]
+        for step in preprocessing:
+            step = clone(step)
+            X_train = step.fit_transform(X_train)
+            X_test = step.transform(X_test)
+        folds.append((X_train, y[train], X_test, y[test]))
+    return folds
+
+
+def successive_halving(estimator, param_distributions, folds, n_candidates=20, resource='n_estimators',
+                       min_resource=None, max_resource=None, factor=3, trials=None, n_jobs=-1,
+                       random_state=42, verbose=True):
+    """
+    Random search with successive halving. All n_candidates are evaluated with min_resource (e.g.
+    trees), the best 1/factor of them with factor times more, and so on until max_resource. Without
+    min_resource every candidate gets max_resource, and with resource=None the candidates are fitted
+    as sampled, both like RandomizedSearchCV. The candidate x fold fits of a round run in parallel on
+    n_jobs cores.
+
+    trials is an optional TrialLog. Returns the parameters of the best candidate of the last round and
+    a DataFrame with the mean test MSE of every candidate and round, best first.
+    """
+    trials = trials if trials is not None else TrialLog(None)
+    candidates = [dict(sorted(p.items())) for p in ParameterSampler(param_distributions, n_candidates, random_state=random_state)]
+    if resource is None:
+        min_resource = max_resource = 0
+    else:
+        max_resource = max_resource or estimator.get_params()[resource]
+    fingerprint = _fingerprint(estimator, folds)
+
+    results = []
+    alive = list(range(len(candidates)))
+    budget = min(min_resource or max_resource, max_resource)
+    round_ = 0
+    while True:
+        tasks = [(c, f) for c in alive for f in range(len(folds))]
+        keys = {(c, f): _trial_key(fingerprint, candidates[c], resource, budget, f) for c, f in tasks}
+        missing = [(c, f) for c, f in tasks if keys[c, f] not in trials]
+        start = time.perf_counter()
+        if missing:
+            jobs = (delayed(_fit_fold)(estimator, candidates[c], resource, budget, folds[f], c, f) for c, f in missing)
+            for c, f, mse, seconds in Parallel(n_jobs=n_jobs, return_as='generator_unordered')(jobs):
+                trials.add({'key': keys[c, f], 'params': candidates[c], 'resource': budget, 'fold': f,
+                            'mse': mse, 'seconds': seconds})
+        if verbose:
+            print(f"Round {round_}: {len(alive)} candidates x {len(folds)} folds" + (f" with {resource}={budget}" if resource else "") + ", "
+                  f"{len(tasks) - len(missing)} resumed, {time.perf_counter() - start:.1f} s")
+
+        scores = {c: np.mean([trials[keys[c, f]]['mse'] for f in range(len(folds))]) for c in alive}
+        for c in alive:
+            results.append({'candidate': c, 'round': round_, 'resource': budget, 'mean_test_mse': scores[c],
+                            **{f'param_{k}': v for k, v in candidates[c].items()}})
+        if budget >= max_resource or len(alive) == 1:
+            break
+        alive = sorted(alive, key=scores.get)[:max(1, math.ceil(len(alive) / factor))]
+        budget = min(budget * factor, max_resource)
+        round_ += 1
+
+    table = pd.DataFrame(results).sort_values(['round', 'mean_test_mse'], ascending=[False, True], ignore_index=True)
+    return candidates[int(table['candidate'].iloc[0])], table
+
+
+def _fit_fold(estimator, params, resource, budget, fold, candidate, fold_index):
+    X_train, y_train, X_test, y_test = fold
+    start = time.perf_counter()
+    model = clone(estimator).set_params(**params, **({resource: int(budget)} if resource else {}))
+    model.fit(X_train, y_train)
+    mse = float(mean_squared_error(y_test, model.predict(X_test)))
+    return candidate, fold_index, mse, time.perf_counter() - start
+
+
+def _fingerprint(estimator, folds):
+    # trials are only reused for the same estimator settings and fold data
+    digest = hashlib.sha256(repr(sorted(estimator.get_params().items())).encode())
+    for fold in folds:
+        for array in fold:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _trial_key(fingerprint, params, resource, budget, fold):
+    return f"{fingerprint}:{json.dumps(params, sort_keys=True, default=str)}:{resource}={int(budget)}:{fold}"
@@ -0,0 +1,118 @@
+# live_plot.py
+
+import time
+import numpy as np
+from PyQt5.QtCore import QTimer
+
+
+class LivePlot:
+    """
+    Plots a running scan on a matplotlib canvas without redrawing the whole figure for every point.
+    The line of the running scan is a persistent animated artist, its data is replaced with set_data
+    and it is blitted onto a cached background at most fps times per second. Overlays and the axes
+    are only redrawn when they change or the running scan leaves the visible area.
+    """
+    def __init__(self, figure, ax, canvas, fps=30, legend=True):
+        self.figure = figure
+        self.ax = ax
+        self.canvas = canvas
+        self.legend = legend
+        self.interval = 1.0 / fps
+        self.live_line, = ax.plot([], [], color='red', label='Current Scan', animated=True)
+        self.overlay_lines = []
+        self.__overlay_key = None
+        self.__background = None
+        self.__dirty = False
+        self.__full_redraw = True
+        self.__last_draw = 0.0
+        canvas.mpl_connect('draw_event', self.__on_draw)
+
+        # redraws are driven by the timer, not by the incoming data
+        self.timer = QTimer(canvas)
+        self.timer.timeout.connect(self.__on_timer)
+        self.timer.start(max(int(1000 * self.interval), 1))
+
+    def set_live_data(self, x, y, color=None, label=None, visible=True):
+        self.live_line.set_data(x, y)
+        if color is not None and color != self.live_line.get_color():
+            self.live_line.set_color(color)
+            self.__full_redraw = True
+        if label is not None and label != self.live_line.get_label():
+            self.live_line.set_label(label)
+            self.__full_redraw = True
+        if visible != self.live_line.get_visible():
+            self.live_line.set_visible(visible)
+            self.__full_redraw = True
+        self.__dirty = True
+
+    def set_overlays(self, overlays, key):
+        # overlays: list of (label, x, y, color), only replaced when key changes
+        if key == self.__overlay_key:
+            return
+        self.__overlay_key = key
+        for line in self.overlay_lines:
+            line.remove()
+        self.overlay_lines = [self.ax.plot(x, y, color=color, label=label)[0] for label, x, y, color in overlays]
+        self.__full_redraw = True
+        self.__dirty = True
+
+    def draw_if_due(self):
+        # Draws when the frame interval has passed, for code that blocks the event loop (and the timer)
+        if self.__dirty and time.perf_counter() - self.__last_draw >= self.interval:
+            self.__draw_frame()
+
+    def redraw(self):
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        if self.legend:
+            handles = [line for line in self.ax.lines if line.get_visible() and not line.get_label().startswith('_')]
+            if handles:
+                self.ax.legend(handles=handles)
+            elif self.ax.get_legend() is not None:
+                self.ax.get_legend().remove()
+        self.__full_redraw = False
+        self.__dirty = False
+        self.__last_draw = time.perf_counter()
+        self.canvas.draw()
+
+    def savefig(self, filename, **kwargs):
+        # animated artists are not included by savefig
+        self.live_line.set_animated(False)
+        try:
+            self.figure.savefig(filename, **kwargs)
+        finally:
+            self.live_line.set_animated(True)
+            self.redraw()
+
+    def __on_timer(self):
+        if self.__dirty:
+            self.__draw_frame()
+
+    def __on_draw(self, event):
+        # the background is captured after every full draw, including resizes and zooming
+        if event is not None and event.canvas is not self.canvas:
+            return
+        self.__background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self.live_line.get_visible():
+            self.ax.draw_artist(self.live_line)
+
+    def __draw_frame(self):
+        if self.__background is None or self.__full_redraw or self.__out_of_view():
+            self.redraw()
+            return
+        self.canvas.restore_region(self.__background)
+        if self.live_line.get_visible():
+            self.ax.draw_artist(self.live_line)
+        self.canvas.blit(self.figure.bbox)
+        self.__dirty = False
+        self.__last_draw = time.perf_counter()
+
+    def __out_of_view(self):
+        x, y = self.live_line.get_data()
+        if not self.live_line.get_visible() or len(x) == 0:
+            return False
+        x = np.asarray(x)
+        y = np.asarray(y)
+        x_min, x_max = sorted(self.ax.get_xlim())
+        y_min, y_max = sorted(self.ax.get_ylim())
+        return np.nanmin(x) < x_min or np.nanmax(x) > x_max or np.nanmin(y) < y_min or np.nanmax(y) > y_max
@@ -0,0 +1,202 @@
+# model_registry.py
+
+import argparse
+import os
+import threading
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from fused_preprocessing import fuse
+
+BUNDLE_FORMAT = 'creatinine-model-bundle'
+BUNDLE_FORMAT_VERSION = 1
+
+
+class ModelBundle:
+    """
+    A model together with the transformers that prepare its input (applied in order) and the
+    names of the features it expects. Bundles are stored as a single joblib file, see save_bundle.
+    """
+    def __init__(self, model, preprocessing=(), features=None, version=None, metadata=None):
+        self.model = model
+        self.preprocessing = list(preprocessing)
+        self.features = list(features) if features is not None else None
+        self.version = version
+        self.metadata = metadata or {}
+
+    def __repr__(self):
+        return f'<ModelBundle {type(self.model).__name__} version={self.version} features={self.features}>'
+
+    def check_features(self, X):
+        # Orders the columns of a DataFrame like the feature schema, arrays must have the right width
+        if self.features is None:
+            return X
+        if isinstance(X, pd.DataFrame):
+            missing = [f for f in self.features if f not in X.columns]
+            if missing:
+                raise ValueError(f"Missing features: {', '.join(missing)}")
+            return X[self.features]
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.features):
+            raise ValueError(f"Expected {len(self.features)} features ({', '.join(self.features)}), got {X.shape[1]}")
+        # the first step may have been fitted with feature names
+        first = self.preprocessing[0] if self.preprocessing else self.model
+        if hasattr(first, 'feature_names_in_'):
+            return pd.DataFrame(X, columns=self.features, copy=False)
+        return X
+
+    def transform(self, X):
+        X = self.check_features(X)
+        for step in self.preprocessing:
+            X = step.transform(X)
+        return X
+
+    def predict(self, X):
+        return self.model.predict(self.transform(X))
+
+    def to_dict(self):
+        return {'format': BUNDLE_FORMAT, 'format_version': BUNDLE_FORMAT_VERSION, 'version': self.version,
+                'model': self.model, 'preprocessing': self.preprocessing, 'features': self.features,
+                'metadata': self.metadata}
+
+
+def save_bundle(bundle, path):
+    """
+    Writes the bundle uncompressed, so its numpy arrays can be memory-mapped when loading. The file
+    is replaced atomically: a registry watching it sees either the old or the new bundle.
+    """
+    if bundle.version is None:
+        bundle.version = time.strftime('%Y%m%d%H%M%S')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    joblib.dump(bundle.to_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_bundle(path, mmap_mode=None):
+    """
+    Loads a bundle file. Other joblib/pickle files are returned as a bundle without preprocessing,
+    so a bare estimator such as rf_model.pkl can be used as well.
+    """
+    return _to_bundle(joblib.load(path, mmap_mode=mmap_mode), path)
+
+
+def _to_bundle(obj, path):
+    if isinstance(obj, dict) and obj.get('format') == BUNDLE_FORMAT:
+        if obj.get('format_version', 0) > BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"{path} needs a newer version of model_registry")
+        return ModelBundle(obj['model'], obj.get('preprocessing', ()), obj.get('features'),
+                           obj.get('version'), obj.get('metadata'))
+    return ModelBundle(obj)
+
+
+class ModelRegistry:
+    """
+    Keeps loaded models warm between predictions. Every registered name refers to a bundle file,
+    or to a bare model file plus the files of its preprocessing steps. The files are checked at
+    most every check_interval seconds, when one of them changed the bundle is loaded again and
+    replaces the old one at once. If loading fails the old bundle stays in use.
+
+    mmap_mode='r' memory-maps the numpy arrays of uncompressed files instead of reading them, which
+    keeps large ensembles out of the process memory until they are used and shares them between
+    processes.
+
+    With fuse_preprocessing the sklearn preprocessing steps are replaced by equivalent fused
+    kernels where possible, see fused_preprocessing.fuse.
+    """
+    def __init__(self, check_interval=1.0, mmap_mode=None, fuse_preprocessing=True):
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self.fuse_preprocessing = fuse_preprocessing
+        self._entries = {}
+        self._files = {}  # path: (signature, object), models shared by several entries are loaded once
+        self._lock = threading.Lock()
+
+    def register(self, name, path, preprocessing=(), features=None):
+        # preprocessing and features are used when path holds a bare model instead of a bundle
+        with self._lock:
+            entry = self._entries.get(name)
+            files = (path,) + tuple(preprocessing)
+            if entry is None or entry['files'] != files or entry['features'] != features:
+                self._entries[name] = {'files': files, 'features': features, 'bundle': None,
+                                       'signature': None, 'checked': 0.0}
+
+    def names(self):
+        return list(self._entries)
+
+    def get(self, name):
+        entry = self._entries[name]
+        now = time.monotonic()
+        if entry['bundle'] is not None and now - entry['checked'] < self.check_interval:
+            return entry['bundle']
+        with self._lock:
+            entry['checked'] = now
+            signature = _signature(entry['files'])
+            if entry['bundle'] is None or signature != entry['signature']:
+                try:
+                    bundle = self._load(entry)
+                except Exception as e:
+                    print(f"Error loading model '{name}': {e}")
+                    if entry['bundle'] is None:
+                        raise
+                else:
+                    entry['bundle'], entry['signature'] = bundle, signature
+            return entry['bundle']
+
+    def predict(self, name, X):
+        return self.get(name).predict(X)
+
+    def warm(self):
+        # Loads all registered models, returns the names that failed
+        failed = []
+        for name in self.names():
+            try:
+                self.get(name)
+            except Exception:
+                failed.append(name)
+        return failed
+
+    def _load(self, entry):
+        path, preprocessing = entry['files'][0], entry['files'][1:]
+        bundle = _to_bundle(self._load_file(path), path)
+        if preprocessing and not bundle.preprocessing:
+            bundle.preprocessing = [self._load_file(p) for p in preprocessing]
+        if bundle.features is None:
+            bundle.features = entry['features']
+        if self.fuse_preprocessing:
+            bundle.preprocessing = fuse(bundle.preprocessing)
+        return bundle
+
+    def _load_file(self, path):
+        signature = _signature((path,))
+        cached = self._files.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, joblib.load(path, mmap_mode=self.mmap_mode))
+            self._files[path] = cached
+        return cached[1]
+
+
+def _signature(files):
+    signature = []
+    for path in files:
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bundle a model with its preprocessing and feature names')
+    parser.add_argument('model', help='joblib file with the fitted model')
+    parser.add_argument('output', help='bundle file to write')
+    parser.add_argument('--preprocessing', nargs='*', default=[], help='joblib files of the preprocessing steps, in order')
+    parser.add_argument('--features', nargs='*', default=None, help='names of the input features, in order')
+    parser.add_argument('--version', default=None)
+    args = parser.parse_args()
+
+    bundle = ModelBundle(joblib.load(args.model), [joblib.load(p) for p in args.preprocessing],
+                         args.features, args.version, {'source': args.model})
+    save_bundle(bundle, args.output)
+    print(f"Saved {bundle} to {args.output}")
@@ -0,0 +1,297 @@
+# prediction_server.py
+
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from dpv_features import FEATURE_NAMES, BASIC_FEATURES, extract_features_batch
+from model_registry import ModelRegistry
+
+
+class MicroBatcher:
+    """
+    Collects the rows submitted by concurrent requests and predicts them together. A batch is
+    started by the first waiting row and closed after max_wait seconds or once it has max_batch
+    rows, so a request waits at most max_wait for others before its batch is predicted. Rows are
+    only batched with rows of the same key, which is passed on as predict(X, key).
+    """
+    def __init__(self, predict, max_batch=256, max_wait=0.005):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.batched_rows = 0
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, name='MicroBatcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, X, key=None):
+        # X is an (n, features) array, returns a Future of the n predictions
+        future = Future()
+        with self._condition:
+            self._queue.append((X, key, future))
+            self._condition.notify()
+        return future
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    break
+                deadline = time.monotonic() + self.max_wait
+                rows = sum(len(X) for X, _, _ in self._queue)
+                while rows < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                    rows = sum(len(X) for X, _, _ in self._queue)
+                batch = []
+                rows = 0
+                key = self._queue[0][1]
+                while (self._queue and self._queue[0][1] == key
+                       and (not batch or rows + len(self._queue[0][0]) <= self.max_batch)):
+                    item = self._queue.popleft()
+                    batch.append(item)
+                    rows += len(item[0])
+            self.__predict(batch, key)
+        for _, _, future in self._queue:
+            future.set_exception(RuntimeError('The server is shutting down'))
+
+    def __predict(self, batch, key):
+        try:
+            predictions = np.asarray(self.predict(np.concatenate([X for X, _, _ in batch]), key))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            # predicted one by one, so only the rows that caused the error fail
+            for item in batch:
+                self.__predict([item], key)
+            return
+        self.batches += 1
+        self.batched_rows += len(predictions)
+        start = 0
+        for X, _, future in batch:
+            future.set_result(predictions[start:start + len(X)])
+            start += len(X)
+
+
+class LatencyStats:
+    # Latencies and scan counts of the requests of the last window seconds
+    def __init__(self, window=60.0, max_samples=100000):
+        self.window = window
+        self.started = time.monotonic()
+        self.requests = 0
+        self.scans = 0
+        self.errors = 0
+        self._samples = deque(maxlen=max_samples)  # (finished, latency, scans)
+        self._lock = threading.Lock()
+
+    def add(self, latency, scans):
+        with self._lock:
+            self.requests += 1
+            self.scans += scans
+            self._samples.append((time.monotonic(), latency, scans))
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+            samples = np.array(self._samples, dtype=np.float64).reshape(-1, 3)
+            summary = {'uptime_s': round(now - self.started, 1), 'requests': self.requests,
+                       'scans': self.scans, 'errors': self.errors}
+        span = min(self.window, now - self.started)
+        if len(samples):
+            p50, p99 = np.percentile(samples[:, 1], [50, 99]) * 1000.0
+            summary.update({'window_s': round(span, 1), 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3),
+                            'requests_per_s': round(len(samples) / span, 1),
+                            'scans_per_s': round(samples[:, 2].sum() / span, 1)})
+        return summary
+
+
+class PredictionService:
+    """
+    Keeps a model warm in a ModelRegistry and predicts through a MicroBatcher. Requests contain
+    scans ({"voltage": [...], "current": [...]}) or precomputed features ({"features": {...}}),
+    either one per request or as a list under "scans". The features are those of the current
+    bundle, a reload that changes them applies to the next request.
+    """
+    def __init__(self, registry, name='model', max_batch=256, max_wait=0.005):
+        self.registry = registry
+        self.name = name
+        self.batcher = MicroBatcher(self.__predict, max_batch, max_wait)
+        self.stats = LatencyStats()
+        registry.get(name)  # loads the model before the first request
+
+    @property
+    def features(self):
+        return self.registry.get(self.name).features or BASIC_FEATURES
+
+    def predict(self, request):
+        scans = request['scans'] if 'scans' in request else [request]
+        features = tuple(self.features)
+        if len(scans) == 0:
+            return np.empty(0)
+        X = np.array([self.__features(scan, features) for scan in scans])
+        # rows computed for other features, before a reload, are predicted in a batch of their own
+        return self.batcher.submit(X, features).result()
+
+    def info(self):
+        bundle = self.registry.get(self.name)
+        return {'model': type(bundle.model).__name__, 'version': bundle.version,
+                'features': bundle.features or BASIC_FEATURES,
+                'max_batch': self.batcher.max_batch, 'max_wait_ms': self.batcher.max_wait * 1000.0,
+                'batches': self.batcher.batches,
+                'mean_batch_size': round(self.batcher.batched_rows / max(self.batcher.batches, 1), 2)}
+
+    def close(self):
+        self.batcher.close()
+
+    def __features(self, scan, features):
+        if 'features' not in scan:
+            columns = [FEATURE_NAMES.index(name) for name in features]
+            row = extract_features_batch(scan['voltage'], scan['current'])[0, columns]
+        else:
+            row = scan['features']
+            if isinstance(row, dict):
+                row = [row[name] for name in features]
+            row = np.asarray(row, dtype=np.float64)
+            if row.shape != (len(features),):
+                raise ValueError(f"Expected {len(features)} features ({', '.join(features)}), got {row.size}")
+        # json accepts Infinity, no model does (NaN is left to the model)
+        if np.isinf(row).any():
+            raise ValueError(f"Infinite features: {', '.join(n for n, v in zip(features, row) if np.isinf(v))}")
+        return row
+
+    def __predict(self, X, features):
+        # the registry swaps in a new model file between batches, the bundle selects its
+        # features from the columns by name
+        return self.registry.get(self.name).predict(pd.DataFrame(X, columns=list(features)))
+
+
+class HTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # POST /predict, GET /stats and GET /health. self.server.service is the PredictionService.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/stats':
+            self.__reply(200, {**service.stats.summary(), **service.info()})
+        elif self.path == '/health':
+            self.__reply(200, {'status': 'ok'})
+        else:
+            self.__reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.__reply(404, {'error': f'Unknown path {self.path}'})
+            return
+        service = self.server.service
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            predictions = service.predict(request)
+        except (ValueError, KeyError, TypeError) as e:
+            service.stats.add_error()
+            self.__reply(400, {'error': f'{type(e).__name__}: {e}'})
+            return
+        except Exception as e:
+            service.stats.add_error()
+            self.__reply(500, {'error': f'{type(e).__name__}: {e}'})
+            return
+        service.stats.add(time.perf_counter() - start, len(predictions))
+        self.__reply(200, {'predictions': predictions.tolist()})
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def __reply(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # Unix sockets refuse connections beyond the backlog
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(service, host='127.0.0.1', port=8765, unix_socket=None, verbose=False):
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, PredictionHandler)
+    else:
+        server = HTTPServer((host, port), PredictionHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve concentration predictions over HTTP or a Unix socket')
+    parser.add_argument('--model', default='rf_model.pkl', help='model bundle or bare model file')
+    parser.add_argument('--preprocessing', nargs='*', default=[], help='preprocessing files of a bare model, in order')
+    parser.add_argument('--features', nargs='*', default=BASIC_FEATURES, help='input features of a bare model, in order')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='listen on this Unix socket instead of host:port')
+    parser.add_argument('--max-batch', type=int, default=256, help='scans per predict call')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='time a request waits for others to batch with')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registry.register('model', args.model, args.preprocessing, args.features)
+    service = PredictionService(registry, 'model', args.max_batch, args.max_wait_ms / 1000.0)
+    server = create_server(service, args.host, args.port, args.unix, args.verbose)
+    print(f"Serving {registry.get('model')} on {args.unix or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
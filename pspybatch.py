@@ -0,0 +1,193 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pspython.pspysession as pspysession
+
+# Loads many session (.pssession) and scan (.csv) files in parallel. Files are decoded in worker
+# processes with the pure Python session reader, every worker returns the curves of one file as
+# a few flat numpy arrays which are concatenated into one columnar dataset.
+
+SESSION_EXTENSION = '.pssession'
+SCAN_EXTENSION = '.csv'
+
+
+class Dataset:
+    # Columnar dataset with one row per data point. file indexes paths, curve indexes
+    # curve_titles and curve_files, measurement is the index of the measurement within its file.
+    # failed lists (path, exception) for the files that could not be loaded.
+    def __init__(self, paths, columns, curve_titles, curve_files, failed=None):
+        self.paths = paths
+        self.columns = columns
+        self.curve_titles = curve_titles
+        self.curve_files = curve_files
+        self.failed = failed if failed is not None else []
+
+    def __len__(self):
+        return len(self.columns['x'])
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns, copy=False)
+
+
+def expand_paths(paths):
+    # Accepts files, directories (searched recursively) and glob patterns. CSV files found in
+    # directories or by patterns are skipped unless they are scans (see is_scan_file), so e.g.
+    # feature tables next to the scans are left out. Files given by name are always kept.
+    if isinstance(paths, str):
+        paths = [paths]
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, filenames in os.walk(path):
+                files = (os.path.join(root, f) for f in sorted(filenames))
+                expanded.extend(p for p in files if _is_data_file(p))
+        elif os.path.exists(path):
+            expanded.append(path)
+        else:
+            expanded.extend(p for p in sorted(glob.glob(path, recursive=True)) if _is_data_file(p))
+    return expanded
+
+
+def is_scan_file(path):
+    # True for a CSV file whose header has recognisable potential and current columns
+    try:
+        with open(path, encoding='utf-8-sig') as f:
+            header = f.readline()
+    except (OSError, UnicodeDecodeError):
+        return False
+    return None not in _match_scan_columns(header.strip().split(','))
+
+
+def _is_data_file(path):
+    name = path.lower()
+    if name.endswith(SESSION_EXTENSION):
+        return True
+    return name.endswith(SCAN_EXTENSION) and is_scan_file(path)
+
+
+def load_file(path):
+    # Returns (curve titles, measurement index per curve, curve lengths, x, y) for one file
+    if path.lower().endswith(SESSION_EXTENSION):
+        titles, measurements, xs, ys = [], [], [], []
+        for n, m in enumerate(pspysession.open_session(path)):
+            for c in m.curves:
+                titles.append(c.Title)
+                measurements.append(n)
+                xs.append(c.x_array)
+                ys.append(c.y_array)
+    else:
+        x, y = read_scan_file(path)
+        titles, measurements, xs, ys = [os.path.splitext(os.path.basename(path))[0]], [0], [x], [y]
+    lengths = np.array([len(x) for x in xs], dtype=np.int64)
+    x = np.concatenate(xs) if xs else np.empty(0)
+    y = np.concatenate(ys) if ys else np.empty(0)
+    return titles, np.array(measurements, dtype=np.int32), lengths, x, y
+
+
+def read_scan_file(path):
+    # Returns the potential and current columns of a scan file, see scan_columns
+    with open(path, encoding='utf-8-sig') as f:
+        header = f.readline()
+    columns = scan_columns(header.strip().split(','))
+    values = np.loadtxt(path, delimiter=',', skiprows=1, usecols=columns, dtype=np.float64, ndmin=2, encoding='utf-8-sig')
+    return np.ascontiguousarray(values[:, 0]), np.ascontiguousarray(values[:, 1])
+
+
+def scan_columns(names):
+    # Indexes of the potential and current columns. The names differ between exports, e.g.
+    # 'Voltage (V)'/'Current (A)' or 'V (145M)'/'uA (147.5M)', columns that are not recognised
+    # default to the first (potential) and second (current) column.
+    potential, current = _match_scan_columns(names)
+    if potential is None:
+        potential = 0 if current != 0 else 1
+    if current is None:
+        current = next(i for i in range(max(len(names), 2)) if i != potential)
+    return potential, current
+
+
+def _match_scan_columns(names):
+    # Indexes of the recognised potential and current columns, None if there is none
+    potential = current = None
+    for i, name in enumerate(names):
+        name = name.strip().strip('"').lower()
+        unit = name.split('(')[0].strip()
+        if potential is None and (name.startswith(('voltage', 'potential', 'e (', 'e/')) or unit in ('v', 'e')):
+            potential = i
+        elif current is None and (name.startswith(('current', 'i (', 'i/')) or unit in ('a', 'ma', '\u00b5a', 'ua', 'na', 'pa', 'i')):
+            current = i
+    return potential, current
+
+
+def iter_load_many(paths, **kwargs):
+    # Yields (index, path, result) in order of completion, result is an exception if the file failed
+    return _iter_load(expand_paths(paths), kwargs.get('workers', os.cpu_count()))
+
+
+def _iter_load(paths, workers):
+    # iter_load_many for expanded paths
+    if workers is None or workers <= 1:
+        for i, path in enumerate(paths):
+            try:
+                yield i, path, load_file(path)
+            except Exception as e:
+                yield i, path, e
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load_file, path): (i, path) for i, path in enumerate(paths)}
+        for future in as_completed(futures):
+            i, path = futures[future]
+            try:
+                yield i, path, future.result()
+            except Exception as e:
+                yield i, path, e
+
+
+def load_many(paths, **kwargs):
+    # progress: optional callback(done, total, path, error) called as files complete. Files that
+    # fail are left out of the dataset and listed in its failed attribute.
+    workers = kwargs.get('workers', os.cpu_count())
+    progress = kwargs.get('progress', None)
+    paths = expand_paths(paths)
+    results = [None] * len(paths)
+    errors = {}
+    for done, (i, path, result) in enumerate(_iter_load(paths, workers)):
+        error = result if isinstance(result, Exception) else None
+        if error is None:
+            results[i] = result
+        else:
+            errors[i] = error
+        if progress is not None:
+            progress(done + 1, len(paths), path, error)
+    return _concatenate(paths, results, [(paths[i], errors[i]) for i in sorted(errors)])
+
+
+def _concatenate(paths, results, failed=None):
+    curve_titles = []
+    curve_files = []
+    file_index, measurement_index, curve_index, xs, ys = [], [], [], [], []
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        titles, measurements, lengths, x, y = result
+        first_curve = len(curve_titles)
+        curve_titles.extend(titles)
+        curve_files.extend([i] * len(titles))
+        file_index.append(np.full(len(x), i, dtype=np.int32))
+        measurement_index.append(np.repeat(measurements, lengths))
+        curve_index.append(np.repeat(np.arange(first_curve, first_curve + len(titles), dtype=np.int32), lengths))
+        xs.append(x)
+        ys.append(y)
+    columns = {
+        'file': _concat(file_index, np.int32),
+        'measurement': _concat(measurement_index, np.int32),
+        'curve': _concat(curve_index, np.int32),
+        'x': _concat(xs, np.float64),
+        'y': _concat(ys, np.float64),
+    }
+    return Dataset(paths, columns, curve_titles, np.array(curve_files, dtype=np.int32), failed)
+
+
+def _concat(arrays, dtype):
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
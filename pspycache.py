@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import pspython.pspydata as pspydata
+import pspython.pspysession as pspysession
+
+# Sidecar cache for converted session files. Every entry consists of one .npy file with the
+# values of all arrays of a session concatenated and a .json file that describes where the
+# arrays of each measurement and curve are located in it. Cached arrays are memory-mapped, so
+# loading a cached session does not parse or copy any data.
+#
+# Entries are keyed by the absolute path of the session file and validated against its size,
+# modification time and content hash. The least recently used entries are removed once the
+# total size of the cache exceeds max_size.
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get('PSPYTHON_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'pspython'))
+DEFAULT_MAX_SIZE = 1024 ** 3  # bytes
+
+_array_fields = ('current_arrays', 'potential_arrays', 'time_arrays', 'freq_arrays',
+                 'zre_arrays', 'zim_arrays', 'aux_input_arrays')
+
+
+def load_session_file(path, **kwargs):
+    # Cached equivalent of pspysession.load_session_file. loader is called as
+    # loader(path, load_peak_data=True, load_eis_fits=True) on a cache miss.
+    load_peak_data = kwargs.get('load_peak_data', False)
+    load_eis_fits = kwargs.get('load_eis_fits', False)
+    cache_dir = kwargs.get('cache_dir', DEFAULT_CACHE_DIR)
+    max_size = kwargs.get('max_size', DEFAULT_MAX_SIZE)
+    loader = kwargs.get('loader', pspysession.load_session_file)
+
+    entry = _entry_path(cache_dir, path)
+    stat = os.stat(path)
+    metadata = _read_metadata(entry)
+    content_hash = None
+    if metadata is not None and (metadata['size'] != stat.st_size or metadata['mtime_ns'] != stat.st_mtime_ns):
+        # a touched but otherwise unchanged file is still a cache hit
+        content_hash = file_hash(path)
+        if metadata['size'] == stat.st_size and metadata['hash'] == content_hash:
+            metadata['mtime_ns'] = stat.st_mtime_ns
+            _write_json(entry + '.json', metadata)
+        else:
+            metadata = None
+
+    if metadata is None:
+        measurements_with_curves = loader(path, load_peak_data=True, load_eis_fits=True)
+        if measurements_with_curves == 0:
+            return 0
+        metadata = _store(entry, path, stat, content_hash or file_hash(path), measurements_with_curves)
+        evict(cache_dir, max_size, keep=entry)
+
+    return _restore(entry, metadata, load_peak_data, load_eis_fits)
+
+
+def warm(directory, **kwargs):
+    # Converts and caches all session files in (the subdirectories of) directory
+    recursive = kwargs.get('recursive', True)
+    paths = []
+    for root, dirs, filenames in os.walk(directory):
+        paths.extend(os.path.join(root, f) for f in filenames if f.lower().endswith('.pssession'))
+        if not recursive:
+            break
+    for n, path in enumerate(sorted(paths)):
+        result = load_session_file(path, **kwargs)
+        print(f'[{n + 1}/{len(paths)}] {path}' + (' failed' if result == 0 else ''))
+    return len(paths)
+
+
+def evict(cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE, keep=None):
+    # Removes the least recently used entries (except keep) until the cache is at most max_size bytes
+    entries = []
+    total = 0
+    if not os.path.isdir(cache_dir):
+        return 0
+    for filename in os.listdir(cache_dir):
+        if not filename.endswith('.npy'):
+            continue
+        entry = os.path.join(cache_dir, filename[:-4])
+        stat = os.stat(entry + '.npy')
+        size = stat.st_size
+        if os.path.exists(entry + '.json'):
+            size += os.path.getsize(entry + '.json')
+        entries.append((stat.st_mtime, size, entry))
+        total += size
+    removed = 0
+    for last_used, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        if entry == keep:
+            continue
+        for extension in ('.json', '.npy'):
+            try:
+                os.remove(entry + extension)
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear(cache_dir=DEFAULT_CACHE_DIR):
+    return evict(cache_dir, max_size=-1)
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as myfile:
+        for block in iter(lambda: myfile.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _entry_path(cache_dir, path):
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key)
+
+
+def _read_metadata(entry):
+    try:
+        with open(entry + '.json', 'r', encoding='utf-8') as myfile:
+            metadata = json.load(myfile)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('version') != CACHE_VERSION or not os.path.exists(entry + '.npy'):
+        return None
+    return metadata
+
+
+def _write_json(path, obj):
+    # written to a temporary file first so readers never see a partial entry
+    with open(path + '.tmp', 'w', encoding='utf-8') as myfile:
+        json.dump(obj, myfile)
+    os.replace(path + '.tmp', path)
+
+
+def _store(entry, path, stat, content_hash, measurements_with_curves):
+    chunks = []
+    offset = 0
+
+    def add(values):
+        nonlocal offset
+        values = np.asarray(values, dtype=np.float64)
+        chunks.append(values)
+        offset += len(values)
+        return [offset - len(values), len(values)]
+
+    measurements = []
+    for m, curves in measurements_with_curves.items():
+        measurements.append({
+            'title': str(m.Title),
+            'timestamp': str(m.timestamp),
+            'arrays': {field: [add(a) for a in getattr(m, field)] for field in _array_fields},
+            'curves': [{'title': str(c.Title), 'x': add(c.x_array), 'y': add(c.y_array)} for c in curves],
+            'peaks': [[p.curve_title, p.peak_height, p.peak_x] for p in m.peaks],
+            'eis_fits': [[f.cdc, [float(v) for v in f.values]] for f in m.eis_fit],
+        })
+
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    data = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+    with open(entry + '.npy.tmp', 'wb') as myfile:
+        np.save(myfile, data)
+    os.replace(entry + '.npy.tmp', entry + '.npy')
+    metadata = {'version': CACHE_VERSION, 'path': os.path.abspath(path), 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'hash': content_hash, 'measurements': measurements}
+    _write_json(entry + '.json', metadata)
+    return metadata
+
+
+def _restore(entry, metadata, load_peak_data, load_eis_fits):
+    data = np.load(entry + '.npy', mmap_mode='r')
+    os.utime(entry + '.npy')  # mark as recently used
+
+    def get(location):
+        start, count = location
+        return data[start:start + count]
+
+    measurements_with_curves = {}
+    for m in metadata['measurements']:
+        arrays = [[get(a) for a in m['arrays'][field]] for field in _array_fields]
+        peaks = [pspydata.Peak(*p) for p in m['peaks']] if load_peak_data else []
+        eis_fits = [pspydata.EISFitResult(*f) for f in m['eis_fits']] if load_eis_fits else []
+        measurement = pspydata.Measurement(m['title'], m['timestamp'], *arrays, peaks, eis_fits)
+        measurements_with_curves[measurement] = [pspydata.Curve(c['title'], get(c['x']), get(c['y'])) for c in m['curves']]
+    return measurements_with_curves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the cache of converted .pssession files')
+    parser.add_argument('command', choices=['warm', 'evict', 'clear'])
+    parser.add_argument('directory', nargs='?', help='directory with session files (warm)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZE, help='maximum cache size in bytes')
+    args = parser.parse_args()
+
+    if args.command == 'warm':
+        if args.directory is None:
+            parser.error('warm requires a directory')
+        warm(args.directory, cache_dir=args.cache_dir, max_size=args.max_size)
+    elif args.command == 'evict':
+        print(f'{evict(args.cache_dir, args.max_size)} entries removed')
+    else:
+        print(f'{clear(args.cache_dir)} entries removed')
+    sys.exit(0)
@@ -1,35 +1,45 @@
 from enum import Enum
+import numpy as np
 
 class Measurement:
-    def __init__(self, title, timestamp, current_arrays, potential_arrays, time_arrays, freq_arrays, zre_arrays, zim_arrays, aux_input_arrays, peaks, eis_fit):
+    __slots__ = ('Title', 'timestamp', 'current_arrays', 'potential_arrays', 'time_arrays', 'freq_arrays',
+                 'zre_arrays', 'zim_arrays', 'aux_input_arrays', 'peaks', 'eis_fit')
+
+    def __init__(self, title, timestamp, current_arrays, potential_arrays, time_arrays, freq_arrays, zre_arrays, zim_arrays, aux_input_arrays, peaks, eis_fit, dtype=np.float64):
         self.Title = title
         self.timestamp = timestamp
-        self.current_arrays = current_arrays
-        self.potential_arrays = potential_arrays
-        self.time_arrays = time_arrays
-        self.freq_arrays = freq_arrays
-        self.zre_arrays = zre_arrays
-        self.zim_arrays = zim_arrays
-        self.aux_input_arrays = aux_input_arrays
+        self.current_arrays = _as_arrays(current_arrays, dtype)
+        self.potential_arrays = _as_arrays(potential_arrays, dtype)
+        self.time_arrays = _as_arrays(time_arrays, dtype)
+        self.freq_arrays = _as_arrays(freq_arrays, dtype)
+        self.zre_arrays = _as_arrays(zre_arrays, dtype)
+        self.zim_arrays = _as_arrays(zim_arrays, dtype)
+        self.aux_input_arrays = _as_arrays(aux_input_arrays, dtype)
         self.peaks = peaks
         self.eis_fit = eis_fit
 
 
 class Curve:
-    def __init__(self, title, x_array, y_array):
+    __slots__ = ('Title', 'x_array', 'y_array')
+
+    def __init__(self, title, x_array, y_array, dtype=np.float64):
         self.Title = title
-        self.x_array = x_array
-        self.y_array = y_array
+        self.x_array = np.asarray(x_array, dtype=dtype)
+        self.y_array = np.asarray(y_array, dtype=dtype)
         
 
 class Peak:
+    __slots__ = ('curve_title', 'peak_height', 'peak_x')
+
     def __init__(self, curve_title, peak_height, peak_x):
         self.curve_title = curve_title
-        self.peak_height = peak_height
-        self.peak_x = peak_x
+        self.peak_height = float(peak_height)
+        self.peak_x = float(peak_x)
 
 
 class EISFitResult:
+    __slots__ = ('cdc', 'values')
+
     def __init__(self, cdc, values):
         self.cdc = cdc
         self.values = self.__convert_values(values)
@@ -42,6 +52,42 @@ class EISFitResult:
         return converted_values
 
 
+def _as_arrays(arrays, dtype):
+    # np.asarray does not copy arrays that already have the requested dtype
+    return [np.asarray(array, dtype=dtype) for array in arrays]
+
+
+def to_columns(measurements_with_curves, dtype=np.float64, share=False):
+    # Packs the curves of a session (as returned by load_session_file) into one contiguous
+    # buffer per column. The curves are copied and left unchanged. With share=True the x_array
+    # and y_array of every curve are replaced by views into these buffers, so the columns and
+    # the curves share their memory afterwards (and the curves get the dtype of the columns).
+    curves = [(n, c) for n, cs in enumerate(measurements_with_curves.values()) for c in cs]
+    lengths = np.array([len(c.x_array) for n, c in curves], dtype=np.int64)
+    offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    columns = {
+        'measurement': np.repeat(np.array([n for n, c in curves], dtype=np.int32), lengths),
+        'curve': np.repeat(np.arange(len(curves), dtype=np.int32), lengths),
+        'x': np.empty(offsets[-1], dtype=dtype),
+        'y': np.empty(offsets[-1], dtype=dtype),
+    }
+    for i, (n, c) in enumerate(curves):
+        start, end = offsets[i], offsets[i + 1]
+        columns['x'][start:end] = c.x_array
+        columns['y'][start:end] = c.y_array
+        if share:
+            c.x_array = columns['x'][start:end]
+            c.y_array = columns['y'][start:end]
+    return columns
+
+
+def to_dataframe(measurements_with_curves, dtype=np.float64, share=False):
+    # Long format DataFrame of all curves in a session, the columns are not copied (see to_columns)
+    import pandas as pd
+    return pd.DataFrame(to_columns(measurements_with_curves, dtype=dtype, share=share), copy=False)
+
+
 def convert_to_measurement(m, **kwargs):
     # Get collection of arrays in the dataset (with the exception of the potential and current arrays
     # arrays contain a single value stored in the Value field.
@@ -168,7 +214,49 @@ class Status(Enum):
     Underload = 2
 
 
+# Arrays with fewer points than this are read per item, DataArray.GetValues() copies the whole
+# array so it only pays off when a substantial part of it is requested (e.g. not for live updates)
+BULK_MIN_COUNT = 16
+
+_net_marshal = None
+
+
 def _get_values_from_NETArray(array, **kwargs):
+    start = kwargs.get('start', 0)
+    count = kwargs.get('count', array.Count)
+    if count >= BULK_MIN_COUNT:
+        try:
+            return _get_values_from_NETArray_bulk(array, start=start, count=count)
+        except Exception:
+            pass  # fall back to reading the array item by item
+    return np.array(_get_values_from_NETArray_per_item(array, start=start, count=count), dtype=np.float64)
+
+
+def _get_values_from_NETArray_bulk(array, **kwargs):
+    # Copies the values of a DataArray into a contiguous float64 buffer with a single
+    # Marshal.Copy instead of crossing the Python/.NET boundary once per data point
+    global _net_marshal
+    start = kwargs.get('start', 0)
+    count = kwargs.get('count', array.Count)
+    values = np.empty(count, dtype=np.float64)
+    if count == 0:
+        return values
+    net_values = array.GetValues()
+    if isinstance(net_values, np.ndarray):
+        # simulated instruments (pspysimulator) keep their data in numpy arrays
+        values[:] = net_values[start:start + count]
+        return values
+    if _net_marshal is None:
+        # imported here so pspydata can be used without pythonnet (e.g. by pspysession)
+        from System import IntPtr, Int64
+        from System.Runtime.InteropServices import Marshal
+        _net_marshal = (Marshal, IntPtr.__overloads__[Int64])
+    marshal, intptr = _net_marshal
+    marshal.Copy(net_values, start, intptr(values.ctypes.data), count)
+    return values
+
+
+def _get_values_from_NETArray_per_item(array, **kwargs):
     start = kwargs.get('start', 0)
     count = kwargs.get('count', array.Count)
     values = list()
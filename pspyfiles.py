@@ -2,6 +2,8 @@ import clr
 import os
 import sys
 from pspython import pspydata
+from pspython import pspycache
+from pspython.pspybatch import load_many, iter_load_many
 
 # Load DLLs
 scriptDir = os.path.dirname(os.path.realpath(__file__))
@@ -25,6 +27,14 @@ from PalmSens.Windows import LoadSaveHelperFunctions
 def load_session_file(path, **kwargs):
     load_peak_data = kwargs.get('load_peak_data', False)
     load_eis_fits = kwargs.get('load_eis_fits', False)
+    use_cache = kwargs.get('use_cache', False)
+
+    if use_cache:
+        # converted arrays are stored next to the cache metadata and memory-mapped on later loads
+        return pspycache.load_session_file(path, load_peak_data=load_peak_data, load_eis_fits=load_eis_fits,
+                                           loader=load_session_file,
+                                           cache_dir=kwargs.get('cache_dir', pspycache.DEFAULT_CACHE_DIR),
+                                           max_size=kwargs.get('max_size', pspycache.DEFAULT_MAX_SIZE))
 
     try:
         session = LoadSaveHelperFunctions.LoadSessionFile(path)
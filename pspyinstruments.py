@@ -1,33 +1,43 @@
-import clr
 from enum import Enum
 import os
 import sys
 import traceback
-from time import sleep
+import time
 import queue
+import asyncio
+import threading
 import pspython.pspydata as pspydata
 
-# Load DLLs 
-scriptDir = os.path.dirname(os.path.realpath(__file__))
-# This dll contains the classes in which the data is stored
-clr.AddReference(scriptDir + '\\PalmSens.Core.dll')
-# This dll is used to load your session file
-clr.AddReference(scriptDir + '\\PalmSens.Core.Windows.dll')
-clr.AddReference("System")
+try:
+    import clr
 
-import System
-import PalmSens
-from PalmSens.Windows.Devices import FTDIDevice, USBCDCDevice, BluetoothDevice
-from PalmSens.Comm import CommManager
-from PalmSens.Windows import CoreDependencies
+    # Load DLLs 
+    scriptDir = os.path.dirname(os.path.realpath(__file__))
+    # This dll contains the classes in which the data is stored
+    clr.AddReference(scriptDir + '\\PalmSens.Core.dll')
+    # This dll is used to load your session file
+    clr.AddReference(scriptDir + '\\PalmSens.Core.Windows.dll')
+    clr.AddReference("System")
 
-CoreDependencies.Init()
+    import System
+    import PalmSens
+    from PalmSens.Windows.Devices import FTDIDevice, USBCDCDevice, BluetoothDevice
+    from PalmSens.Comm import CommManager
+    from PalmSens.Windows import CoreDependencies
+
+    CoreDependencies.Init()
+    NET_AVAILABLE = True
+except Exception:
+    # pythonnet and/or the PalmSens libraries are not available (e.g. on Linux),
+    # only simulated instruments (see pspysimulator) can be used
+    NET_AVAILABLE = False
 
 
 class Instrument:
-    def __init__(self, name, conn):
+    def __init__(self, name, conn, device=None):
         self.name = name
         self.connection = conn
+        self.device = device
 
 
 class InstrumentManager:
@@ -40,29 +50,50 @@ class InstrumentManager:
         self.__active_measurement = None
         self.__active_eis_data = None
         self.__index_last_sent_point = 0
-        self.__queue = queue.Queue()
+        # the .NET event handlers put callbacks in this queue, they are executed by the thread
+        # that runs measure (or by the event loop, see AsyncInstrumentManager)
+        self.__queue = kwargs.get('queue', None) or queue.Queue()
+        self.__queue_timeout = kwargs.get('queue_timeout', 0.5)
+        # in batch mode new_data_callback receives chunks of points as numpy arrays instead of single points,
+        # a chunk is sent once it holds max_chunk_size points or its first point is max_chunk_latency seconds old
+        self.__batch = kwargs.get('batch', False)
+        self.__max_chunk_size = kwargs.get('max_chunk_size', 1000)
+        self.__max_chunk_latency = kwargs.get('max_chunk_latency', 0.05)
+        self.__pending = {}
+        self.__curve_info = {}
+        self.__eis_arrays = {}
 
     def discover_instruments(self, **kwargs):
         discover_ftdi = kwargs.get('ftdi', True)
         discover_usbcdc = kwargs.get('usbcdc', True)
         discover_bluetooth = kwargs.get('bluetooth', False)
+        simulated_devices = kwargs.get('simulated', [])
         self.available_instruments = []
         self.__available_instruments = {}
 
+        if not NET_AVAILABLE:
+            discover_ftdi = discover_usbcdc = False
+
         if discover_ftdi:
             ftdi_instruments = FTDIDevice.DiscoverAllDevices("")
             for ftdi_instrument in ftdi_instruments[0]:
-                instrument = Instrument(ftdi_instrument.ToString(), 'ftdi')
+                instrument = Instrument(ftdi_instrument.ToString(), 'ftdi', ftdi_instrument)
                 self.available_instruments.append(instrument)
                 self.__available_instruments[instrument] = ftdi_instrument
 
         if discover_usbcdc:
             usbcdc_instruments = USBCDCDevice.DiscoverDevices("")
             for usbcdc_instrument in usbcdc_instruments[0]:
-                instrument = Instrument(usbcdc_instrument.ToString(), 'usbcdc')
+                instrument = Instrument(usbcdc_instrument.ToString(), 'usbcdc', usbcdc_instrument)
                 self.available_instruments.append(instrument)
                 self.__available_instruments[instrument] = usbcdc_instrument
 
+        # simulated devices (pspysimulator.SimulatedDevice) replay recorded measurements
+        for simulated_device in simulated_devices:
+            instrument = Instrument(simulated_device.ToString(), 'simulated', simulated_device)
+            self.available_instruments.append(instrument)
+            self.__available_instruments[instrument] = simulated_device
+
         return self.available_instruments
     
     def is_connected(self):
@@ -86,9 +117,13 @@ class InstrumentManager:
             print('An instance of the InstrumentManager can only be connected to one instrument at a time')
             return 0
         try:
-            __instrument = self.__available_instruments[instrument]
+            # instruments discovered by another manager (e.g. in an InstrumentPool) carry their device
+            __instrument = self.__available_instruments.get(instrument, instrument.device)
             __instrument.Open()
-            self.__comm = CommManager(__instrument)
+            if instrument.connection == 'simulated':
+                self.__comm = __instrument.CreateCommManager()
+            else:
+                self.__comm = CommManager(__instrument)
             return 1
         except Exception as e:
             traceback.print_exc()
@@ -104,48 +139,70 @@ class InstrumentManager:
             return 0
 
         try:
-            # subscribe to events indicating the start and end of the measurement
-            self.__comm.BeginMeasurement += self.__measurement_started_callback
-            self.__comm.EndMeasurement += self.__measurement_ended_callback            
-            self.__comm.BeginReceiveEISData += self.__receiving_eis_data_callback
-            self.__comm.BeginReceiveCurve += self.__receiving_curve_callback
-
-            # obtain lock on library (required when communicating with instrument)
-            self.__comm.ClientConnection.Semaphore.Wait()
-
-            # send and execute the method on the instrument
-            self.__comm.Measure(method)
-            self.__measuring = True
-
-            # release lock on library (required when communicating with instrument)
-            self.__comm.ClientConnection.Semaphore.Release()
+            self.begin_measurement(method)
 
+            # block until the .NET event handlers enqueue work, the timeout only
+            # serves to notice when measuring has been stopped from another thread
+            timeout = min(self.__queue_timeout, self.__max_chunk_latency) if self.__batch else self.__queue_timeout
             while self.__measuring:
-                qsize = self.__queue.qsize()
-                for i in range(qsize):
-                    callback = self.__queue.get()                    
-                    callback()
-                    self.__queue.task_done()
-                sleep(.001)
+                try:
+                    callback = self.__queue.get(timeout=timeout)
+                except queue.Empty:
+                    self.__flush_pending(due_only=True)
+                    continue
+                callback()
+                self.__queue.task_done()
 
-            measurement = self.__active_measurement
-            self.__active_measurement = None
-            return pspydata.convert_to_measurement(measurement)
+            return self.end_measurement()
 
         except Exception as e:
             traceback.print_exc()
+            self.abort_measurement()
+            return None
 
-            if self.__comm.ClientConnection.Semaphore.CurrentCount == 0:
-                # release lock on library (required when communicating with instrument)
-                self.__comm.ClientConnection.Semaphore.Release()
+    def begin_measurement(self, method):
+        # subscribe to events indicating the start and end of the measurement
+        self.__comm.BeginMeasurement += self.__measurement_started_callback
+        self.__comm.EndMeasurement += self.__measurement_ended_callback            
+        self.__comm.BeginReceiveEISData += self.__receiving_eis_data_callback
+        self.__comm.BeginReceiveCurve += self.__receiving_curve_callback
 
-            self.__active_measurement = None
-            self.__comm.BeginMeasurement -= self.__measurement_started_callback
-            self.__comm.EndMeasurement -= self.__measurement_ended_callback
-            self.__comm.BeginReceiveEISData -= self.__receiving_eis_data_callback
-            self.__comm.BeginReceiveCurve -= self.__receiving_curve_callback
-            self.__measuring = False
-            return None
+        # obtain lock on library (required when communicating with instrument)
+        self.__comm.ClientConnection.Semaphore.Wait()
+
+        # send and execute the method on the instrument
+        self.__comm.Measure(method)
+        self.__measuring = True
+
+        # release lock on library (required when communicating with instrument)
+        self.__comm.ClientConnection.Semaphore.Release()
+        return
+
+    def is_measuring(self):
+        return self.__measuring
+
+    def end_measurement(self):
+        measurement = self.__active_measurement
+        self.__active_measurement = None
+        return pspydata.convert_to_measurement(measurement)
+
+    def abort_measurement(self):
+        if self.__comm.ClientConnection.Semaphore.CurrentCount == 0:
+            # release lock on library (required when communicating with instrument)
+            self.__comm.ClientConnection.Semaphore.Release()
+
+        self.__active_measurement = None
+        self.__comm.BeginMeasurement -= self.__measurement_started_callback
+        self.__comm.EndMeasurement -= self.__measurement_ended_callback
+        self.__comm.BeginReceiveEISData -= self.__receiving_eis_data_callback
+        self.__comm.BeginReceiveCurve -= self.__receiving_curve_callback
+        self.__measuring = False
+        return
+
+    def flush_pending(self, due_only=False):
+        # sends the points that are held back in batch mode
+        self.__flush_pending(due_only=due_only)
+        return
 
     def __measurement_started_callback(self, sender, measurement):
         self.__queue.put(lambda: self.__measurement_started(sender, measurement))
@@ -173,22 +230,45 @@ class InstrumentManager:
 
     def __eis_data_update(self, eisdata, start, count):
         self.__index_last_sent_point = start + count - 1
-        arrays = eisdata.EISDataSet.GetDataArrays()
         if self.new_data_callback is not None:
+            if self.__batch:
+                self.__add_pending(eisdata, start, count, self.__send_eis_data_chunk)
+                return
+            arrays = self.__get_eis_arrays(eisdata)
             for i in range(start, start + count):
                 data = {}
                 data['index'] = i + 1
-                for array in arrays:
-                    array_type = pspydata.ArrayType(array.ArrayType)
-                    if (array_type == pspydata.ArrayType.Frequency):
-                        data['frequency'] = pspydata._get_values_from_NETArray(array, start=i, count=1)
-                    elif (array_type == pspydata.ArrayType.ZRe):
-                        data['zre'] = pspydata._get_values_from_NETArray(array, start=i, count=1)
-                    elif (array_type == pspydata.ArrayType.ZIm):
-                        data['zim'] = pspydata._get_values_from_NETArray(array, start=i, count=1)
+                for key, array in arrays:
+                    data[key] = pspydata._get_values_from_NETArray(array, start=i, count=1)
                 self.new_data_callback(data)
         return
 
+    def __send_eis_data_chunk(self, eisdata, start, count):
+        data = {}
+        data['index'] = range(start + 1, start + count + 1)
+        for key, array in self.__get_eis_arrays(eisdata):
+            data[key] = pspydata._get_values_from_NETArray(array, start=start, count=count)
+        self.new_data_callback(data)
+        return
+
+    def __get_eis_arrays(self, eisdata):
+        # the data arrays of interest are looked up once per EIS data set
+        if eisdata not in self.__eis_arrays:
+            arrays = []
+            for array in eisdata.EISDataSet.GetDataArrays():
+                try:
+                    array_type = pspydata.ArrayType(array.ArrayType)
+                except ValueError:
+                    continue
+                if (array_type == pspydata.ArrayType.Frequency):
+                    arrays.append(('frequency', array))
+                elif (array_type == pspydata.ArrayType.ZRe):
+                    arrays.append(('zre', array))
+                elif (array_type == pspydata.ArrayType.ZIm):
+                    arrays.append(('zim', array))
+            self.__eis_arrays[eisdata] = arrays
+        return self.__eis_arrays[eisdata]
+
     def __eis_data_finished_callback(self, eisdata, args):
         self.__queue.put(lambda: self.__eis_data_finished(eisdata))
         return
@@ -199,6 +279,8 @@ class InstrumentManager:
         if eisdata.NPoints - self.__index_last_sent_point > 2:
             self.__eis_data_update(eisdata,
                                    self.__index_last_sent_point + 1, eisdata.NPoints - self.__index_last_sent_point)
+        self.__flush_pending(eisdata)
+        self.__eis_arrays.pop(eisdata, None)
         return
 
     def __receiving_curve_callback(self, sender, e):
@@ -219,18 +301,69 @@ class InstrumentManager:
     def __curve_update(self, curve, start, count):
         self.__index_last_sent_point = start + count - 1
         if self.new_data_callback is not None:
+            if self.__batch:
+                self.__add_pending(curve, start, count, self.__send_curve_chunk)
+                return
+            x_unit, x_type, y_unit, y_type = self.__get_curve_info(curve)
             for i in range(start, start + count):
                 data = {}
                 data['index'] = i + 1
                 data['x'] = pspydata._get_values_from_NETArray(curve.XAxisDataArray, start=i, count=1)
-                data['x_unit'] = curve.XUnit.ToString()
-                data['x_type'] = pspydata.ArrayType(curve.XAxisDataArray.ArrayType).name
+                data['x_unit'] = x_unit
+                data['x_type'] = x_type
                 data['y'] = pspydata._get_values_from_NETArray(curve.YAxisDataArray, start=i, count=1)
-                data['y_unit'] = curve.YUnit.ToString()
-                data['y_type'] = pspydata.ArrayType(curve.YAxisDataArray.ArrayType).name
+                data['y_unit'] = y_unit
+                data['y_type'] = y_type
                 self.new_data_callback(data)
         return
 
+    def __send_curve_chunk(self, curve, start, count):
+        x_unit, x_type, y_unit, y_type = self.__get_curve_info(curve)
+        data = {}
+        data['index'] = range(start + 1, start + count + 1)
+        data['x'] = pspydata._get_values_from_NETArray(curve.XAxisDataArray, start=start, count=count)
+        data['x_unit'] = x_unit
+        data['x_type'] = x_type
+        data['y'] = pspydata._get_values_from_NETArray(curve.YAxisDataArray, start=start, count=count)
+        data['y_unit'] = y_unit
+        data['y_type'] = y_type
+        self.new_data_callback(data)
+        return
+
+    def __get_curve_info(self, curve):
+        # units and array types do not change during a measurement, look them up once per curve
+        if curve not in self.__curve_info:
+            self.__curve_info[curve] = (curve.XUnit.ToString(), pspydata.ArrayType(curve.XAxisDataArray.ArrayType).name,
+                                        curve.YUnit.ToString(), pspydata.ArrayType(curve.YAxisDataArray.ArrayType).name)
+        return self.__curve_info[curve]
+
+    def __add_pending(self, source, start, count, send):
+        # extends the range of points of source (a curve or EIS data set) that still has to be sent
+        pending = self.__pending.get(source)
+        if pending is None:
+            pending = [start, start + count, time.perf_counter(), send]
+            self.__pending[source] = pending
+        else:
+            pending[0] = min(pending[0], start)
+            pending[1] = max(pending[1], start + count)
+        if pending[1] - pending[0] >= self.__max_chunk_size or time.perf_counter() - pending[2] >= self.__max_chunk_latency:
+            self.__flush_pending(source)
+        return
+
+    def __flush_pending(self, source=None, due_only=False):
+        if source is None:
+            sources = list(self.__pending)
+        else:
+            sources = [source] if source in self.__pending else []
+        now = time.perf_counter()
+        for source in sources:
+            start, end, first, send = self.__pending[source]
+            if due_only and now - first < self.__max_chunk_latency:
+                continue
+            del self.__pending[source]
+            for chunk_start in range(start, end, self.__max_chunk_size):
+                send(source, chunk_start, min(end, chunk_start + self.__max_chunk_size) - chunk_start)
+        return
 
     def __curve_finished_callback(self, curve, args):
         self.__queue.put(lambda: self.__curve_finished(curve))
@@ -239,6 +372,8 @@ class InstrumentManager:
     def __curve_finished(self, curve):
         curve.NewDataAdded -= self.__curve_new_data_callback
         curve.Finished -= self.__curve_finished_callback
+        self.__flush_pending(curve)
+        self.__curve_info.pop(curve, None)
         return  
 
     def __measurement_ended_callback(self, sender, args):
@@ -246,6 +381,9 @@ class InstrumentManager:
         return
 
     def __measurement_ended(self):
+        self.__flush_pending()
+        self.__curve_info = {}
+        self.__eis_arrays = {}
         self.__measuring = False
         self.__comm.EndMeasurement -= self.__measurement_ended_callback
         self.__comm.BeginReceiveCurve -= self.__receiving_curve_callback
@@ -269,6 +407,201 @@ class InstrumentManager:
         self.__available_instruments = {}
 
 
+class AsyncMeasurement:
+    # Returned by AsyncInstrumentManager.measure. Iterate it with async for to receive the data
+    # chunks while the measurement runs, await it to obtain the final pspydata.Measurement.
+    _end = object()
+
+    def __init__(self, loop):
+        self.measurement = None
+        self.__chunks = asyncio.Queue()
+        self.__done = loop.create_future()
+
+    def _put(self, data):
+        self.__chunks.put_nowait(data)
+
+    def _finish(self, measurement):
+        self.measurement = measurement
+        self.__chunks.put_nowait(self._end)
+        if not self.__done.done():
+            self.__done.set_result(measurement)
+
+    def _fail(self, exception):
+        self.__chunks.put_nowait(exception)
+        if not self.__done.done():
+            self.__done.set_exception(exception)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.__chunks.get()
+        if item is self._end:
+            self.__chunks.put_nowait(self._end)
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __await__(self):
+        return self.__done.__await__()
+
+
+class AsyncInstrumentManager:
+    # asyncio counterpart of InstrumentManager. The .NET event handlers hand their work to the event
+    # loop with loop.call_soon_threadsafe, so measuring does not block the thread running the loop.
+    def __init__(self, **kwargs):
+        self.__loop = None
+        self.__active = None
+        self.__flush_handle = None
+        self.__max_chunk_latency = kwargs.get('max_chunk_latency', 0.05)
+        self.__manager = InstrumentManager(new_data_callback=self.__new_data, batch=True, queue=self,
+                                           max_chunk_size=kwargs.get('max_chunk_size', 1000),
+                                           max_chunk_latency=self.__max_chunk_latency)
+        self.available_instruments = []
+
+    def discover_instruments(self, **kwargs):
+        self.available_instruments = self.__manager.discover_instruments(**kwargs)
+        return self.available_instruments
+
+    def is_connected(self):
+        return self.__manager.is_connected()
+
+    def connect(self, instrument):
+        return self.__manager.connect(instrument)
+
+    def disconnect(self):
+        return self.__manager.disconnect()
+
+    def measure(self, method):
+        if not self.__manager.is_connected():
+            raise RuntimeError('Not connected to an instrument')
+        if self.__active is not None:
+            raise RuntimeError('A measurement is already running')
+        self.__loop = asyncio.get_running_loop()
+        self.__active = AsyncMeasurement(self.__loop)
+        active = self.__active
+        try:
+            self.__manager.begin_measurement(method)
+        except Exception:
+            self.__active = None
+            self.__manager.abort_measurement()
+            raise
+        self.__flush_handle = self.__loop.call_later(self.__max_chunk_latency, self.__flush)
+        return active
+
+    def put(self, callback):
+        # called by the InstrumentManager event handlers on the .NET threads
+        if self.__loop is not None:
+            self.__loop.call_soon_threadsafe(self.__dispatch, callback)
+
+    def __dispatch(self, callback):
+        active = self.__active
+        try:
+            callback()
+            if active is not None and not self.__manager.is_measuring():
+                self.__finish(active, self.__manager.end_measurement)
+        except Exception as e:
+            traceback.print_exc()
+            if active is not None:
+                self.__manager.abort_measurement()
+                self.__finish(active, None, e)
+
+    def __finish(self, active, end_measurement, exception=None):
+        self.__active = None
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        if exception is None:
+            active._finish(end_measurement())
+        else:
+            active._fail(exception)
+
+    def __flush(self):
+        if self.__active is None:
+            return
+        self.__manager.flush_pending(due_only=True)
+        self.__flush_handle = self.__loop.call_later(self.__max_chunk_latency, self.__flush)
+
+    def __new_data(self, data):
+        if self.__active is not None:
+            self.__active._put(data)
+
+
+class InstrumentPool:
+    # Connects to several instruments and measures on all of them at the same time. Every instrument
+    # gets its own InstrumentManager (and with it its own CommManager, library lock and event queue)
+    # and measures in its own thread. Live data is passed to new_data_callback with additional
+    # 'instrument' (the Instrument, unique even for instruments with the same name) and
+    # 'instrument_name' (for display) keys, calls to the callback are serialized.
+    def __init__(self, **kwargs):
+        self.new_data_callback = kwargs.pop('new_data_callback', None)
+        self.__manager_kwargs = kwargs  # passed on to every InstrumentManager, e.g. batch=True
+        self.__managers = {}
+        self.__lock = threading.Lock()
+        self.available_instruments = []
+
+    def discover_instruments(self, **kwargs):
+        self.available_instruments = InstrumentManager().discover_instruments(**kwargs)
+        return self.available_instruments
+
+    @property
+    def connected_instruments(self):
+        return list(self.__managers)
+
+    def connect(self, instruments=None):
+        # connects the given (by default all discovered) instruments, returns the number of connected instruments
+        if instruments is None:
+            instruments = self.available_instruments
+        for instrument in instruments:
+            if instrument in self.__managers:
+                continue
+            manager = InstrumentManager(new_data_callback=self.__tagged_callback(instrument), **self.__manager_kwargs)
+            if manager.connect(instrument) == 1:
+                self.__managers[instrument] = manager
+        return len(self.__managers)
+
+    def disconnect(self):
+        disconnected = 0
+        for instrument, manager in list(self.__managers.items()):
+            disconnected += manager.disconnect()
+            del self.__managers[instrument]
+        return disconnected
+
+    def measure(self, method):
+        # method is used on every instrument, or a dict with a method per instrument (or instrument name).
+        # Blocks until all measurements have finished, returns {Instrument: Measurement}
+        # (None for instruments on which the measurement failed).
+        results = {}
+        threads = []
+        for instrument, manager in self.__managers.items():
+            if isinstance(method, dict):
+                instrument_method = method.get(instrument, method.get(instrument.name))
+                if instrument_method is None:
+                    continue
+            else:
+                instrument_method = method
+            thread = threading.Thread(target=self.__measure, args=(manager, instrument_method, instrument, results),
+                                      name=f'measure {instrument.name}', daemon=True)
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def __measure(self, manager, method, instrument, results):
+        results[instrument] = manager.measure(method)
+
+    def __tagged_callback(self, instrument):
+        def callback(data):
+            if self.new_data_callback is not None:
+                data['instrument'] = instrument
+                data['instrument_name'] = instrument.name
+                with self.__lock:
+                    self.new_data_callback(data)
+        return callback
+
+
 # just a test
 if __name__ == '__main__':
     manager = InstrumentManager()
@@ -0,0 +1,268 @@
+import datetime
+import json
+import re
+import sys
+import numpy as np
+import pspython.pspydata as pspydata
+
+# .pssession files are UTF-16 encoded JSON documents written by PalmSens.Core. They can be read
+# without pythonnet or the PalmSens .NET libraries, which makes this module usable on any platform.
+#
+# The bulk of a session file are the "datavalues" lists of the data arrays. These are not decoded
+# when a session is opened, only their location in the file is stored. The remaining metadata is
+# small and is used to index the measurements by title, technique and array type. The values of an
+# array are decoded the first time they are accessed.
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+_datavalues_key = '"datavalues":'
+_value_pattern = re.compile(r'"v":([^,}\]]+)')
+
+
+def load_session_file(path, **kwargs):
+    load_peak_data = kwargs.get('load_peak_data', False)
+    load_eis_fits = kwargs.get('load_eis_fits', False)
+
+    try:
+        session = open_session(path)
+        return session.to_dict(load_peak_data=load_peak_data, load_eis_fits=load_eis_fits)
+    except:
+        error = sys.exc_info()[0]
+        print(error)
+        return 0
+
+
+def open_session(path, **kwargs):
+    # array_types: optional collection of pspydata.ArrayType (or their names), arrays of
+    # other types in the measurement datasets are never decoded
+    array_types = kwargs.get('array_types', None)
+    return Session(path, array_types=array_types)
+
+
+def read_session_text(path):
+    with open(path, 'r', encoding='utf-16') as myfile:
+        text = myfile.read()
+    # PSTrace terminates the document with a stray byte order mark
+    return text.strip('\ufeff' + _whitespace)
+
+
+class Session:
+    def __init__(self, path, array_types=None):
+        self.path = path
+        self.array_types = None if array_types is None else {_to_array_type(a) for a in array_types}
+        self.__text = read_session_text(path)
+        metadata, self.__spans = _split_datavalues(self.__text)
+        self.measurements = [SessionMeasurement(self, m) for m in _iter_measurements(metadata)]
+        self.titles = {}
+        self.techniques = {}
+        for m in self.measurements:
+            self.titles.setdefault(m.Title, []).append(m)
+            self.techniques.setdefault(m.technique, []).append(m)
+
+    def __len__(self):
+        return len(self.measurements)
+
+    def __iter__(self):
+        return iter(self.measurements)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.titles[key][0]
+        return self.measurements[key]
+
+    def by_title(self, title):
+        return self.titles.get(title, [])
+
+    def by_technique(self, technique):
+        return self.techniques.get(technique.lower(), [])
+
+    def by_array_type(self, array_type):
+        array_type = _to_array_type(array_type)
+        return [m for m in self.measurements if array_type in m.array_types]
+
+    def to_dict(self, **kwargs):
+        # Same structure as returned by load_session_file, decodes everything that is not filtered out
+        load_peak_data = kwargs.get('load_peak_data', False)
+        load_eis_fits = kwargs.get('load_eis_fits', False)
+        measurements_with_curves = {}
+        for m in self.measurements:
+            measurements_with_curves[m.to_measurement(load_peak_data=load_peak_data, load_eis_fits=load_eis_fits)] = m.curves
+        return measurements_with_curves
+
+    def decode(self, placeholder):
+        start, end = self.__spans[placeholder]
+        return np.array(_value_pattern.findall(self.__text, start, end), dtype=np.float64)
+
+
+class SessionMeasurement:
+    def __init__(self, session, m):
+        self.__session = session
+        self.__m = m
+        self.__arrays = {}
+        self.__curves = None
+        self.Title = m.get('title', '')
+        self.timestamp = get_timestamp(m)
+        self.technique = get_technique(m)
+        self.array_types = set()
+        for array in m.get('dataset', {}).get('values', []):
+            self.array_types.add(get_array_type(array))
+
+    def __repr__(self):
+        return f'<SessionMeasurement {self.Title!r} ({self.technique})>'
+
+    def arrays(self, array_type):
+        array_type = _to_array_type(array_type)
+        if array_type not in self.__arrays:
+            allowed = self.__session.array_types
+            arrays = []
+            if allowed is None or array_type in allowed:
+                for array in self.__m.get('dataset', {}).get('values', []):
+                    if get_array_type(array) == array_type:
+                        arrays.append(self.__session.decode(array['datavalues']))
+            self.__arrays[array_type] = arrays
+        return self.__arrays[array_type]
+
+    @property
+    def current_arrays(self):
+        return self.arrays(pspydata.ArrayType.Current)
+
+    @property
+    def potential_arrays(self):
+        return self.arrays(pspydata.ArrayType.Potential)
+
+    @property
+    def time_arrays(self):
+        return self.arrays(pspydata.ArrayType.Time)
+
+    @property
+    def freq_arrays(self):
+        return self.arrays(pspydata.ArrayType.Frequency)
+
+    @property
+    def zre_arrays(self):
+        return self.arrays(pspydata.ArrayType.ZRe)
+
+    @property
+    def zim_arrays(self):
+        return self.arrays(pspydata.ArrayType.ZIm)
+
+    @property
+    def aux_input_arrays(self):
+        return self.arrays(pspydata.ArrayType.AuxInput)
+
+    @property
+    def curves(self):
+        if self.__curves is None:
+            self.__curves = []
+            for c in self.__m.get('curves', []):
+                self.__curves.append(pspydata.Curve(c.get('title', ''),
+                                                    self.__session.decode(c['xaxisdataarray']['datavalues']),
+                                                    self.__session.decode(c['yaxisdataarray']['datavalues'])))
+        return self.__curves
+
+    @property
+    def peaks(self):
+        # Peaks are stored as an index into the curve together with the left and right
+        # points of their baseline, the height is relative to the baseline at the peak
+        peaks = []
+        for c, curve in zip(self.__m.get('curves', []), self.curves):
+            for p in c.get('peaklist', []):
+                i = p.get('peak', -1)
+                if i < 0 or i >= len(curve.x_array):
+                    continue
+                peak_x = curve.x_array[i]
+                if p['rightx'] != p['leftx']:
+                    slope = (p['righty'] - p['lefty']) / (p['rightx'] - p['leftx'])
+                    baseline = p['lefty'] + slope * (peak_x - p['leftx'])
+                else:
+                    baseline = p['lefty']
+                peaks.append(pspydata.Peak(str(curve.Title), curve.y_array[i] - baseline, peak_x))
+        return peaks
+
+    @property
+    def eis_fit(self):
+        eis_fits = []
+        for eisdata in self.__m.get('eisdatalist', []):
+            if eisdata is not None:
+                eis_fits.append(pspydata.EISFitResult(eisdata.get('cdc'), eisdata.get('fitvalues')))
+        return eis_fits
+
+    def to_measurement(self, **kwargs):
+        load_peak_data = kwargs.get('load_peak_data', False)
+        load_eis_fits = kwargs.get('load_eis_fits', False)
+        return pspydata.Measurement(self.Title, self.timestamp,
+                                    self.current_arrays, self.potential_arrays, self.time_arrays, self.freq_arrays,
+                                    self.zre_arrays, self.zim_arrays, self.aux_input_arrays,
+                                    self.peaks if load_peak_data else [], self.eis_fit if load_eis_fits else [])
+
+
+def _split_datavalues(text):
+    # Replaces every "datavalues" list by an integer placeholder and returns the remaining
+    # metadata text together with the (start, end) location of each list in the original text
+    parts = []
+    spans = []
+    last = 0
+    idx = text.find(_datavalues_key)
+    while idx >= 0:
+        start = text.index('[', idx + len(_datavalues_key))
+        end = _find_list_end(text, start)
+        parts.append(text[last:idx + len(_datavalues_key)])
+        parts.append(str(len(spans)))
+        spans.append((start, end))
+        last = end
+        idx = text.find(_datavalues_key, end)
+    parts.append(text[last:])
+    return ''.join(parts), spans
+
+
+def _find_list_end(text, start):
+    # Data values only contain numbers in the common case, then the list ends at the first ']'
+    end = text.index(']', start) + 1
+    if ':"' not in text[start:end]:
+        return end
+    # values with text (e.g. debug information) may contain ']', let the json decoder find the end
+    return _decoder.raw_decode(text, start)[1]
+
+
+def _iter_measurements(text):
+    start = text.find('"measurements":')
+    if start < 0:
+        return
+    idx = text.index('[', start) + 1
+    length = len(text)
+    while idx < length:
+        while text[idx] in _whitespace or text[idx] == ',':
+            idx += 1
+        if text[idx] == ']':
+            return
+        m, idx = _decoder.raw_decode(text, idx)
+        yield m
+
+
+def _to_array_type(array_type):
+    if isinstance(array_type, str):
+        return pspydata.ArrayType[array_type]
+    return pspydata.ArrayType(array_type)
+
+
+def get_array_type(array):
+    try:
+        return pspydata.ArrayType(array.get('arraytype', -1))
+    except ValueError:
+        return pspydata.ArrayType.Unspecified  # arraytype not implemented in ArrayType enum
+
+
+def get_technique(m):
+    # METHOD_ID in the method stored with the measurement, e.g. 'dpv', 'cv' or 'eis'
+    for line in m.get('method', '').split('\r\n'):
+        if line.startswith('METHOD_ID='):
+            return line[len('METHOD_ID='):].lower()
+    return ''
+
+
+def get_timestamp(m):
+    # Timestamps are stored as .NET ticks (100 ns intervals since 0001-01-01)
+    ticks = m.get('timestamp')
+    if ticks is None:
+        return ''
+    return str(datetime.datetime(1, 1, 1) + datetime.timedelta(microseconds=ticks // 10))
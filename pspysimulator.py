@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+import numpy as np
+import pspython.pspydata as pspydata
+import pspython.pspysession as pspysession
+from pspython.pspybatch import read_scan_file
+
+# Simulated instrument that replays recorded measurements (.pssession curves or EIS data, or scan
+# CSV files) through the same objects and events as the PalmSens .NET CommManager:
+# BeginMeasurement, BeginReceiveCurve/BeginReceiveEISData, NewDataAdded, Finished and EndMeasurement.
+# It does not need pythonnet, drivers or hardware, so the acquisition path can be tested anywhere.
+#
+#     device = pspysimulator.SimulatedDevice('scan_147_5M.csv', rate=20000, noise=0.01)
+#     manager = pspyinstruments.InstrumentManager(new_data_callback=callback)
+#     instruments = manager.discover_instruments(simulated=[device])
+#     manager.connect(instruments[0])
+#     measurement = manager.measure(None)
+#
+# Points are added at rate points per second. When the rate exceeds what the timer resolution
+# allows all points that are due are added at once, like an instrument that buffers its data.
+
+
+class SimulatedDevice:
+    def __init__(self, source, **kwargs):
+        # source: path to a .pssession or scan .csv file
+        # measurement: index or title of the measurement to replay from a session file
+        # rate: points per second, jitter: standard deviation (s) of the delay of every update,
+        # noise: standard deviation of the noise added to the y values, seed: random seed
+        self.source = source
+        self.name = kwargs.get('name', 'Simulated ' + os.path.basename(source))
+        self.rate = kwargs.get('rate', 1000.0)
+        self.jitter = kwargs.get('jitter', 0.0)
+        self.noise = kwargs.get('noise', 0.0)
+        self.seed = kwargs.get('seed', None)
+        self.repeat = kwargs.get('repeat', 1)  # number of times the recording is replayed per measurement
+        self.title, self.curves, self.eis = _load_recording(source, kwargs.get('measurement', 0))
+        self.is_open = False
+
+    def ToString(self):
+        return self.name
+
+    def Open(self):
+        self.is_open = True
+
+    def Close(self):
+        self.is_open = False
+
+    def CreateCommManager(self):
+        return SimulatedCommManager(self)
+
+
+class SimulatedCommManager:
+    def __init__(self, device):
+        self.device = device
+        self.BeginMeasurement = SimulatedEvent()
+        self.EndMeasurement = SimulatedEvent()
+        self.BeginReceiveEISData = SimulatedEvent()
+        self.BeginReceiveCurve = SimulatedEvent()
+        self.ClientConnection = _Namespace(Semaphore=SimulatedSemaphore())
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def Measure(self, method):
+        if self.__thread is not None and self.__thread.is_alive():
+            raise RuntimeError('The simulated instrument is already measuring')
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__replay, name=f'replay {self.device.name}', daemon=True)
+        self.__thread.start()
+
+    def Disconnect(self):
+        self.__stop.set()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.device.Close()
+
+    def __replay(self):
+        device = self.device
+        rng = np.random.default_rng(device.seed)
+        measurement = SimulatedMeasurement(device.title)
+        self.BeginMeasurement.fire(self, measurement)
+        clock = _Clock(device.rate, device.jitter, rng, self.__stop)
+
+        for n in range(device.repeat):
+            for title, x_type, x, y_type, y in device.curves:
+                if device.noise:
+                    y = y + rng.normal(0.0, device.noise, len(y))
+                curve = SimulatedCurve(title, x_type, x, y_type, y)
+                measurement.add_curve(curve)
+                self.BeginReceiveCurve.fire(self, _Namespace(GetCurve=lambda curve=curve: curve))
+                curve.wait_for_subscriber(self.__stop)
+                for start, end in clock.blocks(len(x)):
+                    curve.add_points(end)
+                    curve.NewDataAdded.fire(curve, _Namespace(StartIndex=start))
+                curve.Finished.fire(curve, None)
+
+            if device.eis is not None:
+                eisdata = SimulatedEISData(*device.eis)
+                measurement.add_eis_data(eisdata)
+                self.BeginReceiveEISData.fire(self, eisdata)
+                eisdata.wait_for_subscriber(self.__stop)
+                for start, end in clock.blocks(eisdata.size):
+                    for i in range(start, end):
+                        eisdata.add_points(i + 1)
+                        eisdata.NewDataAdded.fire(eisdata, _Namespace(Index=i))
+                eisdata.Finished.fire(eisdata, None)
+
+        self.EndMeasurement.fire(self, None)
+
+
+class SimulatedEvent:
+    # Mimics a .NET event, handlers are added and removed with += and -=
+    def __init__(self):
+        self.__handlers = []
+        self.__lock = threading.Lock()
+
+    def __iadd__(self, handler):
+        with self.__lock:
+            self.__handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        with self.__lock:
+            if handler in self.__handlers:
+                self.__handlers.remove(handler)
+        return self
+
+    def __len__(self):
+        return len(self.__handlers)
+
+    def fire(self, sender, args):
+        with self.__lock:
+            handlers = list(self.__handlers)
+        for handler in handlers:
+            handler(sender, args)
+
+
+class SimulatedSemaphore:
+    # Mimics the SemaphoreSlim of the client connection
+    def __init__(self):
+        self.__semaphore = threading.Semaphore(1)
+        self.CurrentCount = 1
+
+    def Wait(self):
+        self.__semaphore.acquire()
+        self.CurrentCount = 0
+
+    def Release(self):
+        self.CurrentCount = 1
+        self.__semaphore.release()
+
+
+class SimulatedDataArray:
+    # Mimics a PalmSens DataArray whose values become available as the measurement progresses
+    def __init__(self, array_type, values):
+        self.ArrayType = array_type.value
+        self.__values = np.asarray(values, dtype=np.float64)
+        self.Count = 0
+
+    def get_Item(self, i):
+        if i >= self.Count:
+            raise IndexError(i)
+        return _Namespace(Value=self.__values[i])
+
+    def GetValues(self):
+        return self.__values[:self.Count]
+
+
+class SimulatedCurve:
+    def __init__(self, title, x_type, x, y_type, y):
+        self.Title = title
+        self.XAxisDataArray = SimulatedDataArray(x_type, x)
+        self.YAxisDataArray = SimulatedDataArray(y_type, y)
+        self.XUnit = _Unit(_units.get(x_type, ''))
+        self.YUnit = _Unit(_units.get(y_type, ''))
+        self.Peaks = None
+        self.NewDataAdded = SimulatedEvent()
+        self.Finished = SimulatedEvent()
+        self.NPoints = 0
+
+    def add_points(self, n_points):
+        self.XAxisDataArray.Count = self.YAxisDataArray.Count = n_points
+        self.NPoints = n_points
+
+    def wait_for_subscriber(self, stop, timeout=1.0):
+        # the manager subscribes to the curve events asynchronously, like a real instrument
+        # give it a moment before the first data arrives
+        _wait_for_subscriber(self.NewDataAdded, stop, timeout)
+
+
+class SimulatedEISData:
+    def __init__(self, frequency, zre, zim):
+        self.__arrays = [SimulatedDataArray(pspydata.ArrayType.Frequency, frequency),
+                         SimulatedDataArray(pspydata.ArrayType.ZRe, zre),
+                         SimulatedDataArray(pspydata.ArrayType.ZIm, zim)]
+        self.EISDataSet = _Namespace(GetDataArrays=lambda: self.__arrays)
+        self.CDC = None
+        self.CDCValues = None
+        self.NewDataAdded = SimulatedEvent()
+        self.Finished = SimulatedEvent()
+        self.NPoints = 0
+        self.size = len(frequency)
+
+    def add_points(self, n_points):
+        for array in self.__arrays:
+            array.Count = n_points
+        self.NPoints = n_points
+
+    def wait_for_subscriber(self, stop, timeout=1.0):
+        _wait_for_subscriber(self.NewDataAdded, stop, timeout)
+
+
+class SimulatedMeasurement:
+    # Provides what pspydata.convert_to_measurement reads from a PalmSens Measurement
+    def __init__(self, title):
+        self.Title = title
+        self.TimeStamp = _Unit(time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.EISdata = []
+        self.__arrays = []
+        self.__curves = []
+        self.DataSet = _Namespace(GetDataArrays=lambda: self.__arrays)
+
+    def GetCurveArray(self):
+        return self.__curves
+
+    def add_curve(self, curve):
+        self.__curves.append(curve)
+        self.__arrays.extend([curve.XAxisDataArray, curve.YAxisDataArray])
+
+    def add_eis_data(self, eisdata):
+        self.EISdata.append(eisdata)
+        self.__arrays.extend(eisdata.EISDataSet.GetDataArrays())
+
+
+class _Clock:
+    # Yields (start, end) ranges of points that are due according to rate, sleeping in between
+    def __init__(self, rate, jitter, rng, stop):
+        self.rate = rate
+        self.jitter = jitter
+        self.rng = rng
+        self.stop = stop
+
+    def blocks(self, n_points):
+        start_time = time.perf_counter()
+        sent = 0
+        while sent < n_points and not self.stop.is_set():
+            due = min(n_points, int((time.perf_counter() - start_time) * self.rate) + 1)
+            if due > sent:
+                if self.jitter:
+                    time.sleep(abs(self.rng.normal(0.0, self.jitter)))
+                yield sent, due
+                sent = due
+            next_time = start_time + sent / self.rate
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self.stop.wait(delay)
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Unit:
+    def __init__(self, text):
+        self.text = text
+
+    def ToString(self):
+        return self.text
+
+
+_units = {pspydata.ArrayType.Potential: 'V', pspydata.ArrayType.Current: 'µA', pspydata.ArrayType.Time: 's',
+          pspydata.ArrayType.Frequency: 'Hz', pspydata.ArrayType.ZRe: 'Ω', pspydata.ArrayType.ZIm: 'Ω'}
+
+
+def _wait_for_subscriber(event, stop, timeout):
+    end = time.perf_counter() + timeout
+    while len(event) == 0 and time.perf_counter() < end and not stop.is_set():
+        time.sleep(0.001)
+
+
+def _load_recording(source, measurement):
+    # Returns (title, [(title, x type, x, y type, y), ...], (frequency, zre, zim) or None)
+    if not source.lower().endswith('.pssession'):
+        x, y = read_scan_file(source)
+        title = os.path.splitext(os.path.basename(source))[0]
+        return title, [(title, pspydata.ArrayType.Potential, x, pspydata.ArrayType.Current, y)], None
+
+    session = pspysession.open_session(source)
+    m = session[measurement]
+    curves = [(c.Title, pspydata.ArrayType.Potential, c.x_array, pspydata.ArrayType.Current, c.y_array) for c in m.curves]
+    eis = None
+    if m.freq_arrays and m.zre_arrays and m.zim_arrays:
+        eis = (m.freq_arrays[0], m.zre_arrays[0], m.zim_arrays[0])
+    return m.Title, curves, eis
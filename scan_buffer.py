@@ -0,0 +1,144 @@
+# scan_buffer.py
+
+from collections import OrderedDict
+import numpy as np
+from dpv_features import FeatureAccumulator
+
+
+class ScanBuffer:
+    """
+    Voltage and current of one scan in preallocated numpy arrays. The capacity is doubled when
+    the scan has more points than expected, so appending a point is amortised O(1).
+
+    With features=True the DPV features are accumulated while points are added, see
+    dpv_features.FeatureAccumulator, and are ready as soon as the scan is complete.
+    """
+    def __init__(self, capacity=256, dtype=np.float64, features=False):
+        self.dtype = np.dtype(dtype)
+        self._voltage = np.empty(max(int(capacity), 1), dtype=self.dtype)
+        self._current = np.empty(max(int(capacity), 1), dtype=self.dtype)
+        self._size = 0
+        self.features = FeatureAccumulator() if features else None
+
+    @classmethod
+    def from_arrays(cls, voltage, current, dtype=np.float64, features=False):
+        buffer = cls(len(voltage), dtype, features)
+        buffer.extend(voltage, current)
+        return buffer
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._voltage)
+
+    @property
+    def voltage(self):
+        # views, valid until the next append
+        return self._voltage[:self._size]
+
+    @property
+    def current(self):
+        return self._current[:self._size]
+
+    @property
+    def nbytes(self):
+        return self._voltage.nbytes + self._current.nbytes
+
+    def append(self, voltage, current):
+        if self._size == self.capacity:
+            self._grow(self._size + 1)
+        self._voltage[self._size] = voltage
+        self._current[self._size] = current
+        self._size += 1
+        if self.features is not None:
+            self.features.update(voltage, current)
+
+    def extend(self, voltage, current):
+        voltage = np.asarray(voltage, dtype=self.dtype).ravel()
+        current = np.asarray(current, dtype=self.dtype).ravel()
+        n = min(len(voltage), len(current))
+        if self._size + n > self.capacity:
+            self._grow(self._size + n)
+        self._voltage[self._size:self._size + n] = voltage[:n]
+        self._current[self._size:self._size + n] = current[:n]
+        self._size += n
+        if self.features is not None:
+            self.features.update(voltage[:n], current[:n])
+
+    def clear(self):
+        self._size = 0
+        if self.features is not None:
+            self.features.reset()
+
+    def copy(self):
+        # trimmed copy, used to keep a completed scan
+        return ScanBuffer.from_arrays(self.voltage, self.current, self.dtype)
+
+    def _grow(self, minimum):
+        capacity = max(minimum, 2 * self.capacity)
+        for name in ('_voltage', '_current'):
+            array = np.empty(capacity, dtype=self.dtype)
+            array[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, array)
+
+
+class ScanStore:
+    """
+    Completed scans kept for the overlay plot, one entry per scan. The oldest scans are dropped
+    once there are more than max_scans or they take more than max_bytes.
+    """
+    def __init__(self, max_scans=50, max_bytes=64 * 1024 ** 2):
+        self.max_scans = max_scans
+        self.max_bytes = max_bytes
+        self._scans = OrderedDict()
+        self._count = 0
+        self.nbytes = 0
+        self.version = 0  # changes whenever scans are added or removed
+
+    def __len__(self):
+        return len(self._scans)
+
+    def __iter__(self):
+        # (label, ScanBuffer) from old to new
+        return iter(self._scans.items())
+
+    def add(self, scan, label=None):
+        if len(scan) == 0:
+            return None
+        self._count += 1
+        label = label or f'Scan {self._count}'
+        if label in self._scans:
+            label = f'{label} ({self._count})'
+        scan = scan.copy()
+        self._scans[label] = scan
+        self.nbytes += scan.nbytes
+        while len(self._scans) > 1 and (len(self._scans) > self.max_scans or self.nbytes > self.max_bytes):
+            old_label, old_scan = self._scans.popitem(last=False)
+            self.nbytes -= old_scan.nbytes
+        self.version += 1
+        return label
+
+    def clear(self):
+        self._scans.clear()
+        self._count = 0
+        self.nbytes = 0
+        self.version += 1
+
+
+def expected_points(technique, params):
+    """
+    Estimates the number of points a measurement will return from the method parameters in the GUI.
+    """
+    try:
+        if technique == "DPV":
+            return int(abs(params["End Potential (V)"] - params["Start Potential (V)"]) / params["Step Potential (V)"]) + 1
+        if technique == "Chronoamperometry":
+            run_time = params.get("Run Time (s)", params.get(" Run Time (s)"))
+            return int(run_time / params["Interval Time (s)"]) + 1
+        if technique == "EIS":
+            return int(params["Number of Frequencies"])
+    except (KeyError, TypeError, ZeroDivisionError):
+        pass
+    return 256
@@ -0,0 +1,52 @@
+# scan_table.py
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class ScanTableModel(QAbstractTableModel):
+    """
+    Table model over a ScanBuffer. Values are only formatted for the rows the view asks for and
+    new points are announced as inserted rows, so the table does not have to be rebuilt per point.
+    """
+    headers = ("Voltage (V)", "Current (A)")
+    formats = ("{:.6f}", "{:.6e}")
+
+    def __init__(self, buffer=None, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.rows = len(buffer) if buffer is not None else 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.rows:
+            return None
+        if role == Qt.DisplayRole:
+            column = self.buffer.voltage if index.column() == 0 else self.buffer.current
+            return self.formats[index.column()].format(column[index.row()])
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    def set_buffer(self, buffer):
+        # Shows another buffer, or the new rows of the current one
+        if buffer is not self.buffer or len(buffer) < self.rows:
+            self.beginResetModel()
+            self.buffer = buffer
+            self.rows = len(buffer)
+            self.endResetModel()
+        elif len(buffer) > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, len(buffer) - 1)
+            self.rows = len(buffer)
+            self.endInsertRows()
@@ -0,0 +1,108 @@
+# score_scans.py
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pspython.pspybatch as pspybatch
+from dpv_features import FEATURE_NAMES, BASIC_FEATURES
+from feature_table import featurize_groups
+from model_registry import ModelRegistry
+
+
+def load_scans(paths, workers=None):
+    """
+    Loads the scan CSVs and session files in paths (files, directories or glob patterns), every
+    curve is one scan. Returns the pspybatch.Dataset and the offsets of the scans in its columns.
+    """
+    dataset = pspybatch.load_many(paths, workers=workers, progress=_report_errors)
+    lengths = np.bincount(dataset.columns['curve'], minlength=len(dataset.curve_titles))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return dataset, offsets
+
+
+def score(dataset, offsets, bundle, batch_size=1024):
+    """
+    Predicts the concentration of every scan. The scans are featurized batch_size at a time and
+    every batch is scored with one predict call. Returns a DataFrame with one row per scan.
+    """
+    features = bundle.features or BASIC_FEATURES
+    columns = [FEATURE_NAMES.index(name) for name in features]
+    x, y = dataset.columns['x'], dataset.columns['y']
+    n_scans = len(offsets) - 1
+    values = np.empty((n_scans, len(FEATURE_NAMES)))
+    predictions = np.full(n_scans, np.nan)
+    for start in range(0, n_scans, batch_size):
+        stop = min(start + batch_size, n_scans)
+        first, last = offsets[start], offsets[stop]
+        values[start:stop] = featurize_groups(x[first:last], y[first:last], offsets[start:stop + 1] - first)
+        # scans with less than 2 points have no features and are not scored
+        valid = np.flatnonzero(~np.isnan(values[start:stop, columns]).all(axis=1)) + start
+        if len(valid):
+            X = pd.DataFrame(values[np.ix_(valid, columns)], columns=features)
+            predictions[valid] = bundle.predict(X)
+
+    curve_files = dataset.curve_files
+    results = pd.DataFrame({
+        'File': [dataset.paths[i] for i in curve_files],
+        'Scan': dataset.curve_titles,
+        'Points': np.diff(offsets),
+        'Predicted_Concentration': predictions,
+    })
+    for name, column in zip(features, columns):
+        results[name] = values[:, column]
+    return results
+
+
+def write_results(results, output, fmt, summary):
+    # fmt is 'csv' or 'json', output None writes to stdout
+    if fmt == 'json':
+        document = {'scans': json.loads(results.to_json(orient='records')), **summary}
+        text = json.dumps(document, indent=2)
+    else:
+        text = results.to_csv(index=False, lineterminator='\n')
+    if output is None:
+        sys.stdout.write(text if text.endswith('\n') else text + '\n')
+    else:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+
+def _report_errors(done, total, path, error):
+    if error is not None:
+        print(f"Error loading {path}: {error}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Predict the concentration of scan CSVs and session files without the GUI')
+    parser.add_argument('paths', nargs='+', help='files, directories or glob patterns (.csv and .pssession)')
+    parser.add_argument('--model', default='rf_model.pkl', help='model bundle or bare model file')
+    parser.add_argument('--preprocessing', nargs='*', default=[], help='preprocessing files of a bare model, in order')
+    parser.add_argument('--features', nargs='*', default=BASIC_FEATURES, help='input features of a bare model, in order')
+    parser.add_argument('-o', '--output', default=None, help='file to write, default stdout')
+    parser.add_argument('--format', choices=('csv', 'json'), default=None, help='default from the output extension, else csv')
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=None, help='processes that load the files')
+    args = parser.parse_args()
+
+    fmt = args.format or ('json' if args.output and args.output.lower().endswith('.json') else 'csv')
+    registry = ModelRegistry()
+    registry.register('model', args.model, args.preprocessing, args.features)
+    bundle = registry.get('model')
+
+    start = time.perf_counter()
+    dataset, offsets = load_scans(args.paths, args.workers)
+    loaded = time.perf_counter()
+    results = score(dataset, offsets, bundle, args.batch_size)
+    end = time.perf_counter()
+    elapsed = end - start
+
+    n_scans = len(results)
+    summary = {'n_scans': n_scans, 'seconds': round(elapsed, 4),
+               'scans_per_second': round(n_scans / elapsed, 1) if elapsed > 0 else None}
+    write_results(results, args.output, fmt, summary)
+    print(f"{n_scans} scans from {len(dataset.paths)} files in {elapsed:.3f} s ({summary['scans_per_second']} scans/s, "
+          f"loading {loaded - start:.3f} s, scoring {end - loaded:.3f} s)", file=sys.stderr)
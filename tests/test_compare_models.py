@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import textwrap
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.neighbors import KNeighborsRegressor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+import compare_models
+
+
+def load_data():
+    data = pd.read_csv(os.path.join(ROOT, 'new_data.csv'))
+    return data.drop(columns=['Concentration']), data['Concentration']
+
+
+def test_compare_with_spawn(tmp_path):
+    # the workers import the calling script again, like creatanine.py on Windows and macOS
+    script = tmp_path / 'comparison.py'
+    script.write_text(textwrap.dedent(f"""
+        import multiprocessing
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        import pandas as pd
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.neighbors import KNeighborsRegressor
+        import compare_models
+
+        data = pd.read_csv({os.path.join(ROOT, 'new_data.csv')!r})
+        X = data.drop(columns=['Concentration'])
+        y = data['Concentration']
+        models = {{'Random Forest': RandomForestRegressor(n_estimators=10), 'KNN': KNeighborsRegressor()}}
+
+        if __name__ == '__main__':
+            multiprocessing.set_start_method('spawn')
+            results = compare_models.compare(X, y, models, [0.6, 0.8], workers=2)
+            print(len(results))
+    """))
+    output = subprocess.run([sys.executable, '-W', 'error', str(script)], capture_output=True, text=True,
+                            timeout=300, check=True)
+    assert output.stdout.split()[-1] == '4'
+
+
+def test_compare_in_process():
+    X, y = load_data()
+    models = {'KNN': KNeighborsRegressor(), 'Random Forest': RandomForestRegressor(n_estimators=10, n_jobs=-1)}
+    results = compare_models.compare(X, y, models, [0.6, 0.8], seeds=(1, 2), workers=1)
+    assert list(results['Model']) == ['KNN'] * 4 + ['Random Forest'] * 4
+    assert list(results['Seed']) == [1, 2, 1, 2] * 2
+
+
+def test_compare_all_failed():
+    X, y = load_data()
+    with pytest.raises(RuntimeError):
+        compare_models.compare(X, y, ['Unknown'], [0.8], workers=1)
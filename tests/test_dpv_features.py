@@ -0,0 +1,95 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import dpv_features
+from bench_dpv_features import extract_features_pandas, synthetic_scans
+
+
+def reference(voltage, current):
+    return np.array([[extract_features_pandas(pd.DataFrame({'Voltage': voltage, 'Current': c}))[name]
+                      for name in dpv_features.FEATURE_NAMES] for c in current])
+
+
+def test_batch_matches_reference():
+    voltage, current = synthetic_scans(50, 99)
+    np.testing.assert_allclose(dpv_features.extract_features_batch(voltage, current),
+                               reference(voltage, current), rtol=1e-9)
+
+
+def test_batch_fwhm_without_points_above_half_peak():
+    # with only negative currents no point reaches half the (negative) peak height
+    voltage = np.linspace(-0.5, 0.5, 5)
+    current = np.array([[-3.0, -2.0, -1.0, -2.0, -3.0],
+                        [1.0, 2.0, 4.0, 2.0, 1.0]])
+    features = dpv_features.extract_features_batch(voltage, current)
+    fwhm = dpv_features.FEATURE_NAMES.index('FWHM')
+    assert features[0, fwhm] == 0.0
+    np.testing.assert_allclose(features, reference(voltage, current), rtol=1e-9)
+
+
+def test_batch_derivatives_skip_nan():
+    # a repeated voltage (dv = 0) and a CV turning point (hs + hd = 0) give NaN derivatives
+    # there, the maxima skip them like Series.max
+    voltage = np.array([[0.0, 0.1, 0.1, 0.2, 0.3, 0.4],
+                        [0.0, 0.1, 0.2, 0.3, 0.2, 0.1]])
+    current = np.array([[1.0, 2.0, 3.0, 5.0, 4.0, 2.0],
+                        [1.0, 3.0, 6.0, 4.0, 2.0, 1.0]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = reference(voltage[0], current[:1]), reference(voltage[1], current[1:])
+    features = dpv_features.extract_features_batch(voltage, current)
+    derivatives = [dpv_features.FEATURE_NAMES.index(name) for name in ('Max_dI/dV', 'Max_d2I/dV2')]
+    assert np.isfinite(features[:, derivatives]).all()
+    np.testing.assert_allclose(features, np.concatenate(expected), rtol=1e-9)
+
+
+def test_batch_peak_skips_nan():
+    voltage = np.linspace(-0.5, 0.5, 5)
+    current = np.array([[np.nan, 2.0, 4.0, 1.0, 0.5],
+                        [np.nan] * 5])
+    features = dpv_features.extract_features_batch(voltage, current)
+    np.testing.assert_array_equal(features[:, :2], [[4.0, 0.0], [np.nan, np.nan]])
+
+
+def test_accumulator_matches_batch():
+    voltage, current = synthetic_scans(5, 99)
+    for c in current:
+        accumulator = dpv_features.FeatureAccumulator()
+        for start in range(0, len(c), 7):
+            accumulator.update(voltage[start:start + 7], c[start:start + 7])
+        np.testing.assert_allclose(accumulator.features(), dpv_features.extract_features_batch(voltage, c)[0],
+                                   rtol=1e-9)
+
+
+def test_accumulator_matches_batch_with_nan_derivatives():
+    # CV-like scans with turning points and repeated voltages, fed in chunks of random sizes
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        n_points = rng.integers(8, 60)
+        steps = rng.choice([-0.01, 0.0, 0.01], n_points - 1, p=[0.3, 0.2, 0.5])
+        voltage = np.concatenate(([0.0], np.cumsum(steps)))
+        current = rng.normal(0, 1, n_points).cumsum()
+        accumulator = dpv_features.FeatureAccumulator()
+        start = 0
+        while start < n_points:
+            stop = start + rng.integers(1, 6)
+            accumulator.update(voltage[start:stop], current[start:stop])
+            start = stop
+        with np.errstate(divide='ignore', invalid='ignore'):
+            streamed = accumulator.features()
+        np.testing.assert_allclose(streamed, dpv_features.extract_features_batch(voltage, current)[0], rtol=1e-7)
+
+
+def test_accumulator_without_points_above_half_peak():
+    voltage = np.linspace(-0.5, 0.5, 5)
+    current = np.array([-3.0, -2.0, -1.0, -2.0, -3.0])
+    accumulator = dpv_features.FeatureAccumulator()
+    accumulator.update(voltage[:2], current[:2])
+    accumulator.update(voltage[2:], current[2:])
+    features = accumulator.features()
+    assert features[dpv_features.FEATURE_NAMES.index('FWHM')] == 0.0
+    np.testing.assert_allclose(features, dpv_features.extract_features_batch(voltage, current)[0], rtol=1e-9)
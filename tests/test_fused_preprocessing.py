@@ -0,0 +1,53 @@
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+from fused_preprocessing import PolynomialScaler, fuse
+from model_registry import ModelRegistry
+
+
+@pytest.mark.parametrize('degree', [1, 2, 3])
+@pytest.mark.parametrize('interaction_only', [False, True])
+@pytest.mark.parametrize('include_bias', [False, True])
+def test_identical_to_sklearn(degree, interaction_only, include_bias):
+    rng = np.random.default_rng(degree)
+    X = rng.normal(0, 3, (200, 4))
+    poly = PolynomialFeatures(degree, interaction_only=interaction_only, include_bias=include_bias).fit(X)
+    scaler = StandardScaler().fit(poly.transform(X))
+    fused = PolynomialScaler.from_sklearn(poly, scaler)
+    np.testing.assert_array_equal(fused.transform(X), scaler.transform(poly.transform(X)))
+    np.testing.assert_array_equal(fused.transform(X[0]), scaler.transform(poly.transform(X[:1])))
+
+
+def test_shipped_preprocessing():
+    poly = joblib.load(os.path.join(ROOT, 'poly.pkl'))
+    scaler = joblib.load(os.path.join(ROOT, 'scaler.pkl'))
+    [fused] = fuse([poly, scaler])
+    X = pd.DataFrame(np.random.default_rng(0).uniform(-0.5, 20, (50, 2)), columns=poly.feature_names_in_)
+    np.testing.assert_array_equal(fused.transform(X), scaler.transform(poly.transform(X)))
+    with pytest.raises(ValueError):
+        fused.transform(X[X.columns[::-1]])
+
+
+def test_registry_checks_feature_order(tmp_path):
+    # a bare model registered with features in another order than poly.pkl was fitted with
+    poly = joblib.load(os.path.join(ROOT, 'poly.pkl'))
+    scaler = joblib.load(os.path.join(ROOT, 'scaler.pkl'))
+    X = pd.DataFrame([[0.1, 2.0], [0.2, 3.0], [0.3, 5.0]], columns=poly.feature_names_in_)
+    model = LinearRegression().fit(scaler.transform(poly.transform(X)), [1.0, 2.0, 3.0])
+    joblib.dump(model, tmp_path / 'model.pkl')
+    preprocessing = [os.path.join(ROOT, 'poly.pkl'), os.path.join(ROOT, 'scaler.pkl')]
+    for fuse_preprocessing in (False, True):
+        registry = ModelRegistry(fuse_preprocessing=fuse_preprocessing)
+        registry.register('ordered', str(tmp_path / 'model.pkl'), preprocessing, list(poly.feature_names_in_))
+        registry.register('reversed', str(tmp_path / 'model.pkl'), preprocessing, list(poly.feature_names_in_[::-1]))
+        np.testing.assert_allclose(registry.predict('ordered', X.to_numpy()), [1.0, 2.0, 3.0])
+        with pytest.raises(ValueError):
+            registry.predict('reversed', X.to_numpy())
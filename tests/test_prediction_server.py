@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+from prediction_server import MicroBatcher
+
+
+def test_failing_rows_do_not_fail_their_batch():
+    def predict(X, key):
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN")
+        return X.sum(axis=1)
+
+    batcher = MicroBatcher(predict, max_batch=8, max_wait=0.2)
+    try:
+        good = batcher.submit(np.ones((2, 3)))
+        bad = batcher.submit(np.full((1, 3), np.nan))
+        other = batcher.submit(np.full((1, 3), 2.0))
+        np.testing.assert_array_equal(good.result(timeout=5), [3.0, 3.0])
+        np.testing.assert_array_equal(other.result(timeout=5), [6.0])
+        with pytest.raises(ValueError):
+            bad.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_rows_are_batched_by_key():
+    keys = []
+
+    def predict(X, key):
+        keys.append((key, len(X)))
+        return np.zeros(len(X))
+
+    batcher = MicroBatcher(predict, max_batch=8, max_wait=0.2)
+    try:
+        futures = [batcher.submit(np.ones((1, 2)), key) for key in ('a', 'a', 'b')]
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        batcher.close()
+    assert keys == [('a', 2), ('b', 1)]
@@ -0,0 +1,70 @@
+import os
+import sys
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+from tree_ensemble import pack
+
+
+def make_data(missing=False, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 1, (600, 6))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(0, 0.1, len(X))
+    if missing:
+        X[rng.random(X.shape) < 0.1] = np.nan
+    return X, y
+
+
+MODELS = [
+    DecisionTreeRegressor(random_state=0),
+    RandomForestRegressor(n_estimators=20, random_state=0),
+    ExtraTreesRegressor(n_estimators=20, random_state=0),
+    GradientBoostingRegressor(n_estimators=30, random_state=0),
+    GradientBoostingRegressor(n_estimators=30, loss='huber', random_state=0),
+    GradientBoostingRegressor(n_estimators=30, loss='quantile', alpha=0.8, random_state=0),
+    GradientBoostingRegressor(n_estimators=30, init='zero', random_state=0),
+]
+
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda m: f"{type(m).__name__}-{m.get_params().get('loss', '')}-{m.get_params().get('init', '')}")
+def test_identical_to_sklearn(model):
+    X, y = make_data()
+    model.fit(X, y)
+    packed = pack(model)
+    X_test, _ = make_data(seed=1)
+    # more rows than block_size and single rows
+    np.testing.assert_array_equal(packed.predict(X_test), model.predict(X_test))
+    np.testing.assert_array_equal(packed.predict(X_test[0]), model.predict(X_test[:1]))
+
+
+@pytest.mark.parametrize('trained_with_missing', [False, True])
+@pytest.mark.parametrize('model', MODELS[:3], ids=lambda m: type(m).__name__)
+def test_missing_values_like_sklearn(model, trained_with_missing):
+    X, y = make_data(trained_with_missing)
+    model.fit(X, y)
+    packed = pack(model)
+    X_test, _ = make_data(True, seed=1)
+    np.testing.assert_array_equal(packed.predict(X_test), model.predict(X_test))
+
+
+@pytest.mark.parametrize('model', MODELS[3:], ids=lambda m: m.get_params()['loss'])
+def test_gradient_boosting_rejects_missing_values(model):
+    X, y = make_data()
+    packed = pack(model.fit(X, y))
+    X[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        model.predict(X)
+    with pytest.raises(ValueError):
+        packed.predict(X)
+
+
+def test_rejects_infinity():
+    X, y = make_data()
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    X[0, 0] = np.inf
+    with pytest.raises(ValueError):
+        pack(model).predict(X)
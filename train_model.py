@@ -1,56 +1,84 @@
+import argparse
 import pandas as pd
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
+from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, StackingRegressor
 from sklearn.preprocessing import StandardScaler, PolynomialFeatures
 from sklearn.linear_model import LinearRegression
 import joblib  # For saving the model
+from hyperparameter_search import TrialLog, make_folds, successive_halving
 
-# Load the CSV file
-data = pd.read_csv('data.csv')  # Make sure 'data.csv' is in the same directory or provide the full path
-
-# Preprocess the data
-X = data[['Voltage', 'Current']]
-y = data['Concentration']
-
-# Add polynomial features
-poly = PolynomialFeatures(degree=2, include_bias=False)
-X_poly = poly.fit_transform(X)
-
-# Feature Scaling
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X_poly)
-
-# Split the data
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-# Hyperparameter tuning and model training
-rf_param_grid = {
-    'n_estimators': [100, 200, 500],
-    'max_depth': [None, 10, 20, 30],
-    'min_samples_split': [2, 5, 10],
-    'min_samples_leaf': [1, 2, 4]
-}
-rf_random_search = RandomizedSearchCV(
-    RandomForestRegressor(random_state=42),
-    param_distributions=rf_param_grid,
-    n_iter=20,
-    cv=5,
-    scoring='neg_mean_squared_error',
-    random_state=42
-)
-rf_random_search.fit(X_train, y_train)
-best_rf_model = rf_random_search.best_estimator_
-
-# Stacking Ensemble Model
-stacking_model = StackingRegressor(
-    estimators=[('rf', best_rf_model)],
-    final_estimator=LinearRegression()
-)
-stacking_model.fit(X_train, y_train)
-
-# Save the model, polynomial features, and scaler
-joblib.dump(stacking_model, 'stacking_model.pkl')
-joblib.dump(poly, 'poly.pkl')
-joblib.dump(scaler, 'scaler.pkl')
-
-print("Model, polynomial features, and scaler saved successfully.")
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the stacking model and save it with its polynomial features and scaler')
+    parser.add_argument('--data', default='data.csv', help='CSV with the features and Concentration')
+    parser.add_argument('--features', nargs='*', default=['Voltage', 'Current'])
+    parser.add_argument('--candidates', type=int, default=20, help='parameter sets to try')
+    parser.add_argument('--cv', type=int, default=5)
+    parser.add_argument('--min-trees', type=int, default=None,
+                        help='start successive halving with this many trees, default: all candidates get the full n_estimators')
+    parser.add_argument('--factor', type=int, default=3, help='halving factor, the best 1/factor candidates go to the next round')
+    parser.add_argument('--trials', default='trials.jsonl', help='completed trials, an interrupted search resumes from them')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='processes for the search, -1 uses every core')
+    args = parser.parse_args()
+
+    # Load the CSV file
+    data = pd.read_csv(args.data)  # Make sure 'data.csv' is in the same directory or provide the full path
+
+    # Preprocess the data
+    X = data[args.features]
+    y = data['Concentration']
+
+    # Add polynomial features
+    poly = PolynomialFeatures(degree=2, include_bias=False)
+    X_poly = poly.fit_transform(X)
+
+    # Feature Scaling
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X_poly)
+
+    # Split the data
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+    # Hyperparameter tuning: the cross-validation folds are split from the raw training rows and
+    # poly/scaler are fitted once per fold, every candidate reuses the transformed folds
+    raw_train, _, _, _ = train_test_split(X.to_numpy(), y, test_size=0.2, random_state=42)
+    folds = make_folds(raw_train, y_train, [PolynomialFeatures(degree=2, include_bias=False), StandardScaler()], args.cv)
+    rf_param_grid = {
+        'n_estimators': [100, 200, 500],
+        'max_depth': [None, 10, 20, 30],
+        'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4]
+    }
+    # with --min-trees n_estimators is the budget of successive halving instead of a parameter,
+    # the largest value is the full budget
+    max_trees = max(rf_param_grid['n_estimators'])
+    if args.min_trees:
+        del rf_param_grid['n_estimators']
+    best_params, results = successive_halving(
+        RandomForestRegressor(n_estimators=max_trees, random_state=42),
+        rf_param_grid,
+        folds,
+        n_candidates=args.candidates,
+        resource='n_estimators' if args.min_trees else None,
+        min_resource=args.min_trees,
+        max_resource=max_trees,
+        factor=args.factor,
+        trials=TrialLog(args.trials),
+        n_jobs=args.n_jobs
+    )
+    print(results.head(10).to_string(index=False))
+    best_rf_model = RandomForestRegressor(random_state=42, n_jobs=args.n_jobs, **{'n_estimators': max_trees, **best_params})
+
+    # Stacking Ensemble Model
+    stacking_model = StackingRegressor(
+        estimators=[('rf', best_rf_model)],
+        final_estimator=LinearRegression(),
+        n_jobs=args.n_jobs
+    )
+    stacking_model.fit(X_train, y_train)
+
+    # Save the model, polynomial features, and scaler
+    joblib.dump(stacking_model, 'stacking_model.pkl')
+    joblib.dump(poly, 'poly.pkl')
+    joblib.dump(scaler, 'scaler.pkl')
+
+    print("Model, polynomial features, and scaler saved successfully.")